@@ -1,22 +1,94 @@
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, HTTPException, Request, status
+from fastapi.exceptions import RequestValidationError
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from sqlalchemy.orm import Session
+from sqlalchemy import select, lambda_stmt
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import make_transient_to_detached
+from pydantic import BaseModel, ValidationError
+from typing import Type, TypeVar
+import hashlib
+import time
 import jwt
 from app.core.database import get_db
 from app.core.config import settings
+from app.core.cache import resume_cache
+from app.core.ttl_cache import TTLCache
 from app.models.user import User
 
 security = HTTPBearer()
 
-def get_current_user(
+ModelT = TypeVar("ModelT", bound=BaseModel)
+
+# Authenticated users cached per token, so repeat requests skip the JWT decode and user query.
+# Each hit still checks Redis (one MGET) for a logout of the token or a change to the user row,
+# so every worker honours both immediately.
+USER_CACHE_TTL = 60
+
+# Verification key and accepted algorithms, fixed for the process lifetime
+_VERIFY_KEY = settings.SECRET_KEY.encode('utf-8')
+_ALGORITHMS = [settings.ALGORITHM]
+_user_cache = TTLCache(maxsize=10_000, ttl=USER_CACHE_TTL)
+
+
+def hash_token(token: str) -> str:
+    """Key under which a token is cached and denylisted"""
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+def _user_snapshot(user: User) -> dict:
+    """Column values of a user, so each request gets its own instance"""
+    return {column.key: getattr(user, column.key) for column in User.__table__.columns}
+
+
+async def invalidate_cached_user(user_id: int) -> None:
+    """Drop cached entries for a user after their row changes, in this and every other worker"""
+    _user_cache.discard_where(lambda entry: entry[0]["id"] == user_id)
+    await resume_cache.mark_user_changed(user_id, time.time(), USER_CACHE_TTL)
+
+
+async def revoke_token(token: str) -> None:
+    """Stop accepting a token before its expiry (used on logout)"""
+    token_hash = hash_token(token)
+    _user_cache.pop(token_hash)
+    try:
+        expires_at = jwt.decode(token, options={"verify_signature": False}).get("exp")
+    except jwt.PyJWTError:
+        return
+    if expires_at:
+        await resume_cache.revoke_token(token_hash, int(expires_at - time.time()))
+
+
+async def get_current_user(
     credentials: HTTPAuthorizationCredentials = Depends(security), 
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ) -> User:
+    token = credentials.credentials
+    token_hash = hash_token(token)
+    
+    cached = _user_cache.get(token_hash)
+    if cached is not None:
+        snapshot, cached_at = cached
+        revoked, changed_at = await resume_cache.get_token_auth_state(token_hash, snapshot["id"])
+        if revoked:
+            _user_cache.pop(token_hash)
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Could not validate credentials",
+                headers={"WWW-Authenticate": "Bearer"},
+            )
+        if changed_at is None or changed_at < cached_at:
+            # Attach a detached copy to this session without querying the database
+            user = User(**snapshot)
+            make_transient_to_detached(user)
+            db.add(user)
+            return user
+        # The row changed since it was cached (possibly through another worker): reload it
+        _user_cache.pop(token_hash)
+    
     try:
-        token = credentials.credentials
-        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
+        payload = jwt.decode(token, _VERIFY_KEY, algorithms=_ALGORITHMS)
         username: str | None = payload.get("sub")
-        if username is None:
+        if username is None or await resume_cache.is_token_revoked(token_hash):
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Could not validate credentials",
@@ -29,11 +101,44 @@ def get_current_user(
             headers={"WWW-Authenticate": "Bearer"},
         )
     
-    user = db.query(User).filter(User.username == username).first()
+    loaded_at = time.time()
+    user = await db.scalar(lambda_stmt(lambda: select(User).where(User.username == username)))
     if user is None:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Could not validate credentials",
             headers={"WWW-Authenticate": "Bearer"},
         )
-    return user
\ No newline at end of file
+    
+    # Never cache beyond the token's own expiry
+    expires_at = payload.get("exp")
+    ttl = USER_CACHE_TTL if expires_at is None else min(USER_CACHE_TTL, expires_at - time.time())
+    if ttl > 0:
+        _user_cache.set(token_hash, (_user_snapshot(user), loaded_at), ttl=ttl)
+    return user
+
+
+def json_body(model: Type[ModelT]):
+    """Dependency that validates the raw request body with model_validate_json.
+
+    Parsing and validation happen in one pydantic-core pass, with no intermediate dict.
+    Routes using it pass json_body_openapi(model) as openapi_extra to keep the body documented.
+    """
+    async def parse_body(request: Request) -> ModelT:
+        try:
+            return model.model_validate_json(await request.body())
+        except ValidationError as e:
+            raise RequestValidationError(
+                [{**error, "loc": ("body", *error["loc"])} for error in e.errors(include_url=False)]
+            )
+    return parse_body
+
+
+def json_body_openapi(model: Type[BaseModel]) -> dict:
+    """OpenAPI request body entry for a route that reads its body through json_body"""
+    return {
+        "requestBody": {
+            "required": True,
+            "content": {"application/json": {"schema": model.model_json_schema()}},
+        }
+    }
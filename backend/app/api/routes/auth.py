@@ -1,22 +1,61 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, status
+from sqlalchemy import select, exists, update, lambda_stmt
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import timedelta
-from app.core.database import get_db
-from app.core.security import verify_password, create_access_token, get_password_hash, validate_sa_id, hash_sa_id
+from app.core.database import get_db, BgSessionLocal
+from app.core.cache import resume_cache
+from app.core.security import (
+    verify_password_async, create_access_token, hash_password_async,
+    password_needs_rehash, validate_sa_id, hash_sa_id
+)
 from app.core.config import settings
 from app.schemas.auth import Token, LoginRequest
 from app.schemas.user import UserCreate, UserResponse
 from app.models.user import User
-from app.api.dependencies import get_current_user
+from app.api.dependencies import (
+    get_current_user, invalidate_cached_user, revoke_token, security, json_body, json_body_openapi
+)
+from fastapi.security import HTTPAuthorizationCredentials
 from fastapi.responses import JSONResponse
 from datetime import datetime
 import logging
 
 logger = logging.getLogger(__name__)
+
+# Columns a user may change on their own profile
+UPDATABLE_USER_FIELDS = frozenset(
+    column.key for column in User.__table__.columns
+    if column.key not in ('id', 'hashed_sa_id', 'hashed_password', 'updated_at')
+)
 router = APIRouter()
 
-@router.post("/register", response_model=UserResponse)
-def register(user: UserCreate, db: Session = Depends(get_db)):
+def _registration_bloom_items(username: str, email: str, hashed_sa_id: str) -> tuple:
+    """Namespaced identifiers stored in the registration bloom filter"""
+    return (f"u:{username}", f"e:{email}", f"id:{hashed_sa_id}")
+
+
+async def fill_registration_bloom():
+    """Load existing users into the registration bloom filter if it is missing or was never filled"""
+    if not await resume_cache.reserve_users_bloom():
+        return
+    
+    async with BgSessionLocal() as db:
+        result = await db.stream(select(User.username, User.email, User.hashed_sa_id))
+        async for rows in result.partitions(1000):
+            await resume_cache.add_to_users_bloom(
+                *(item for row in rows for item in _registration_bloom_items(*row))
+            )
+    await resume_cache.mark_users_bloom_ready()
+    logger.info("Registration bloom filter filled from the users table")
+
+
+@router.post("/register", response_model=UserResponse, openapi_extra=json_body_openapi(UserCreate))
+async def register(
+    background_tasks: BackgroundTasks,
+    user: UserCreate = Depends(json_body(UserCreate)),
+    db: AsyncSession = Depends(get_db)
+):
     """
     Register a new user with POPI Act compliance
     """
@@ -27,44 +66,42 @@ def register(user: UserCreate, db: Session = Depends(get_db)):
             detail="Invalid South African ID number format"
         )
     
+    # Consent is enforced by UserCreate itself (422 with the POPI / terms messages)
+    
     # Hash the ID number for storage
     hashed_id = hash_sa_id(user.sa_id_number)
+    bloom_items = _registration_bloom_items(user.username, user.email, hashed_id)
     
-    # Check if user already exists by username, email, or hashed SA ID
-    db_user = db.query(User).filter(
-        (User.username == user.username) | 
-        (User.email == user.email) |
-        (User.hashed_sa_id == hashed_id)
-    ).first()
-    
-    if db_user:
-        if db_user.username == user.username:
-            detail = "Username already registered"
-        elif db_user.email == user.email:
-            detail = "Email already registered"
-        else:
-            detail = "South African ID number already registered"
+    # The bloom filter rules out brand-new identifiers without a query; anything it
+    # might have seen is confirmed against the unique indexes in one round trip
+    might_contain = await resume_cache.users_bloom_might_contain(*bloom_items)
+    if might_contain is None:
+        # Filter lost (Redis restart or eviction): check the database and rebuild it
+        background_tasks.add_task(fill_registration_bloom)
+    if might_contain is not False:
+        username_taken, email_taken, sa_id_taken = (await db.execute(
+            select(
+                exists().where(User.username == user.username),
+                exists().where(User.email == user.email),
+                exists().where(User.hashed_sa_id == hashed_id),
+            )
+        )).one()
         
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail=detail
-        )
-    
-    # Verify consent requirements
-    if not user.consent_popi:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="POPI Act consent is required to use this service"
-        )
-    
-    if not user.consent_terms:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Terms and conditions consent is required"
-        )
+        if username_taken or email_taken or sa_id_taken:
+            if username_taken:
+                detail = "Username already registered"
+            elif email_taken:
+                detail = "Email already registered"
+            else:
+                detail = "South African ID number already registered"
+            
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=detail
+            )
     
     # Create new user with hashed ID and password
-    hashed_password = get_password_hash(user.password)
+    hashed_password = await hash_password_async(user.password)
     db_user = User(
         username=user.username,
         email=user.email,
@@ -78,25 +115,40 @@ def register(user: UserCreate, db: Session = Depends(get_db)):
     )
     
     db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
+    try:
+        await db.commit()
+    except IntegrityError:
+        # A stale bloom filter let a duplicate through; the unique indexes still reject it
+        await db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Username, email or South African ID number already registered"
+        )
+    await db.refresh(db_user)
+    await resume_cache.add_to_users_bloom(*bloom_items)
     
     # Log consent for audit trail
-    logger.info(f"User registered with consent: {db_user.username}, POPI: {user.consent_popi}, Terms: {user.consent_terms}")
+    logger.info(
+        "User registered with consent: %s, POPI: %s, Terms: %s",
+        db_user.username, user.consent_popi, user.consent_terms
+    )
     
     return db_user
 
-@router.post("/login", response_model=Token)
-def login(login_data: LoginRequest, db: Session = Depends(get_db)):
+@router.post("/login", response_model=Token, openapi_extra=json_body_openapi(LoginRequest))
+async def login(login_data: LoginRequest = Depends(json_body(LoginRequest)), db: AsyncSession = Depends(get_db)):
     """
     Login user with username/email and password
     """
-    # Allow login with either username or email
-    user = db.query(User).filter(
-        (User.username == login_data.username) | (User.email == login_data.username)
-    ).first()
+    # Allow login with either username or email; only the columns needed to authenticate
+    identifier = login_data.username
+    user = (await db.execute(lambda_stmt(
+        lambda: select(User.id, User.username, User.email, User.hashed_password, User.is_active).where(
+            (User.username == identifier) | (User.email == identifier)
+        )
+    ))).first()
 
-    if not user or not verify_password(login_data.password, user.hashed_password):
+    if not user or not await verify_password_async(login_data.password, user.hashed_password):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username/email or password",
@@ -111,6 +163,15 @@ def login(login_data: LoginRequest, db: Session = Depends(get_db)):
             headers={"WWW-Authenticate": "Bearer"},
         )
     
+    # Transparently upgrade legacy bcrypt digests to Argon2id
+    if password_needs_rehash(user.hashed_password):
+        await db.execute(
+            update(User)
+            .where(User.id == user.id)
+            .values(hashed_password=await hash_password_async(login_data.password))
+        )
+        await db.commit()
+    
     access_token_expires = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(
         data={"sub": user.username, "user_id": user.id, "email": user.email}, 
@@ -126,10 +187,14 @@ def read_users_me(current_user: User = Depends(get_current_user)):
     return current_user
 
 @router.post("/logout")
-def logout(current_user: User = Depends(get_current_user)):
+async def logout(
+    current_user: User = Depends(get_current_user),
+    credentials: HTTPAuthorizationCredentials = Depends(security)
+):
     """
-    Simple logout endpoint
+    Logout endpoint - the token is denylisted until it expires
     """
+    await revoke_token(credentials.credentials)
     return JSONResponse(
         status_code=status.HTTP_200_OK,
         content={
@@ -139,10 +204,10 @@ def logout(current_user: User = Depends(get_current_user)):
     )
 
 @router.put("/me", response_model=UserResponse)
-def update_user_profile(
+async def update_user_profile(
     user_update: dict,  
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Update user profile (excluding sensitive fields)
@@ -158,39 +223,55 @@ def update_user_profile(
     
     # Handle username change with availability check
     if 'username' in user_update:
-        existing_user = db.query(User).filter(
-            User.username == user_update['username'],
-            User.id != current_user.id
-        ).first()
+        existing_user = await db.scalar(
+            select(User).where(
+                User.username == user_update['username'],
+                User.id != current_user.id
+            )
+        )
         if existing_user:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="Username already taken"
             )
     
-    # Update allowed fields
-    for field, value in user_update.items():
-        if hasattr(current_user, field) and field not in ['id', 'hashed_sa_id', 'hashed_password']:
-            setattr(current_user, field, value)
+    # Update allowed fields in one UPDATE ... RETURNING round trip
+    allowed = {field: value for field, value in user_update.items() if field in UPDATABLE_USER_FIELDS}
+    updated_user = (await db.execute(
+        update(User)
+        .where(User.id == current_user.id)
+        .values(**allowed, updated_at=datetime.utcnow())
+        .returning(User)
+        .execution_options(synchronize_session=False, populate_existing=True)
+    )).scalar_one()
+    await db.commit()
+    await invalidate_cached_user(current_user.id)
     
-    current_user.updated_at = datetime.utcnow()
-    db.commit()
-    db.refresh(current_user)
-    return current_user
+    # New identifiers must reach the registration bloom filter, or a later sign-up with
+    # them would skip the duplicate check and only hit the unique index
+    changed_identifiers = [
+        prefix + allowed[field]
+        for field, prefix in (('username', 'u:'), ('email', 'e:'))
+        if allowed.get(field)
+    ]
+    if changed_identifiers:
+        await resume_cache.add_to_users_bloom(*changed_identifiers)
+    return updated_user
 
 @router.post("/consent/withdraw-marketing")
-def withdraw_marketing_consent(
+async def withdraw_marketing_consent(
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Withdraw marketing consent
     """
     current_user.consent_marketing = False
     current_user.updated_at = datetime.utcnow()
-    db.commit()
+    await db.commit()
+    await invalidate_cached_user(current_user.id)
     
-    logger.info(f"User {current_user.username} withdrew marketing consent")
+    logger.info("User %s withdrew marketing consent", current_user.username)
     
     return {"message": "Marketing consent withdrawn successfully"}
 
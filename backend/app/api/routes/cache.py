@@ -15,20 +15,12 @@ async def get_cache_status():
         return {"cache_enabled": False}
     
     try:
-        # Count all cached analyses
-        analysis_keys = resume_cache.redis_client.keys("analysis:*")
-        
-        # Count by user (for statistics only)
-        user_stats = {}
-        for key in analysis_keys:
-            parts = key.split(":")
-            if len(parts) >= 2:
-                user_id = parts[1] if len(parts) > 2 else "shared"
-                user_stats[user_id] = user_stats.get(user_id, 0) + 1
+        # Count by user (for statistics only) from the per-user cache indexes
+        user_stats = await resume_cache.get_cache_stats()
         
         return {
             "cache_enabled": True,
-            "total_cached_analyses": len(analysis_keys),
+            "total_cached_analyses": sum(user_stats.values()),
             "users_with_cached_data": len(user_stats),
             "cache_statistics": user_stats
         }
@@ -44,22 +36,16 @@ async def clear_my_cache(current_user: User = Depends(get_current_user)):
     
     try:
         user_id = str(current_user.id)
-        keys_before = resume_cache.redis_client.keys(f"analysis:{user_id}:*")
-        user_resumes_key = f"user_resumes:{user_id}"
-        
-        # Delete user's analysis cache
-        if keys_before:
-            resume_cache.redis_client.delete(*keys_before)
         
-        # Delete user's resume tracking
-        resume_cache.redis_client.delete(user_resumes_key)
+        # Delete user's analysis cache and resume tracking
+        removed = await resume_cache.invalidate_user_resumes(user_id)
         
-        logger.info(f"User cache cleared: {current_user.username}, {len(keys_before)} analyses removed")
+        logger.info(f"User cache cleared: {current_user.username}, {removed} analyses removed")
         
         return {
-            "message": f"Your cache has been cleared. {len(keys_before)} analyses removed.",
+            "message": f"Your cache has been cleared. {removed} analyses removed.",
             "user_id": user_id,
-            "analyses_cleared": len(keys_before)
+            "analyses_cleared": removed
         }
         
     except Exception as e:
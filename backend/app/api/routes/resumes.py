@@ -1,6 +1,8 @@
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, BackgroundTasks, Form
-from fastapi.responses import RedirectResponse
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, BackgroundTasks, Form, Query, Header
+from fastapi.responses import RedirectResponse, Response
+from sqlalchemy import select, exists, bindparam, insert
+from sqlalchemy.orm import load_only
+from sqlalchemy.ext.asyncio import AsyncSession
 from app.core.database import get_db
 from app.core.performance import timer, timing_context
 from app.core.cache import resume_cache 
@@ -9,63 +11,109 @@ from app.models.resume import Resume
 from app.models.analysis_result import AnalysisResult
 from app.api.dependencies import get_current_user
 from app.services.file_processor import FileProcessor
-from app.services.gemini_ai import gemini_ai_service
-from app.services.preview_generator import PreviewGenerator
-from app.services.supabase_storage import SupabaseStorageService
+from app.services.gemini_ai import get_gemini_ai_service
+from app.services.analysis_writer import analysis_writer
+from app.services.preview_generator import (
+    PreviewGenerator, PREVIEW_DEFAULT_WIDTH, PREVIEW_MIN_WIDTH, PREVIEW_MAX_WIDTH, has_rendered_preview
+)
+from app.services.supabase_storage import SupabaseStorageService, get_storage_service
 from app.schemas.analysis_result import (
     AnalysisResultResponse, 
     UploadResponse,
     ReanalyzeResponse,
     AnalysisHistoryResponse,
     ResumeListWrapper,
-    ResumeListResponse
+    ResumeListResponse,
+    ANALYSIS_RESULT_LIST_ADAPTER
 )
 import os
 from datetime import datetime
 import json
 from typing import Optional
+from functools import lru_cache
 import asyncio
 
 router = APIRouter()
 
+# Shared service instances, created on first use and then reused across requests
+# so the Supabase and HTTP clients (and their connection pools) are built once per process
+@lru_cache(maxsize=1)
+def get_file_processor() -> FileProcessor:
+    return FileProcessor(get_storage_service())
+
+
+@lru_cache(maxsize=1)
+def get_preview_generator() -> PreviewGenerator:
+    return PreviewGenerator(get_storage_service())
+
+
+# Ownership-guard statements, built once per column set and reused with bound parameters
+_owned_resume_statements: dict = {}
+
+
+async def _get_owned_resume(db: AsyncSession, resume_id: int, user_id: int, *columns) -> Optional[Resume]:
+    """Load a resume only if it belongs to the user, fetching just the given columns (plus the key)"""
+    cache_key = tuple(column.key for column in columns)
+    stmt = _owned_resume_statements.get(cache_key)
+    if stmt is None:
+        stmt = select(Resume).where(
+            Resume.id == bindparam("resume_id"),
+            Resume.user_id == bindparam("user_id")
+        ).options(load_only(Resume.id, *columns))
+        _owned_resume_statements[cache_key] = stmt
+    return await db.scalar(stmt, {"resume_id": resume_id, "user_id": user_id})
+
+# Categories of the AI response, in the order they are bound in structure_ai_analysis
+_AI_CATEGORIES = ("ATS", "toneAndStyle", "content", "structure", "skills")
+
+# Recommendation text templates per category, built once at import
+_RECOMMENDATION_TEMPLATES = {
+    category: category + ": {} - {}"
+    for category in ("toneAndStyle", "content", "structure", "skills")
+}
+
 @timer("structure_ai_analysis")
 def structure_ai_analysis(ai_result: dict) -> dict:
     """Convert the new AI response format to our database schema"""
     try:
         # Handle service errors
         if ai_result.get("analysis_error"):
-            error_result = get_error_analysis(ai_result.get("error_message", "AI service error"))
-            error_result["raw_analysis"] = ai_result 
-            return error_result
+            return get_error_analysis(ai_result.get("error_message", "AI service error"), ai_result)
 
-        # Extract tips for each category to use as recommendations
-        all_recommendations = []
-        
-        # Process ATS tips
-        ats_tips = ai_result.get("ATS", {}).get("tips", [])
-        for tip in ats_tips:
-            if tip.get("type") == "improve":
-                all_recommendations.append(f"ATS: {tip.get('tip', '')}")
-        
-        # Process other categories
-        categories = ["toneAndStyle", "content", "structure", "skills"]
-        for category in categories:
-            category_data = ai_result.get(category, {})
-            tips = category_data.get("tips", [])
-            for tip in tips:
-                if tip.get("type") == "improve":
-                    all_recommendations.append(f"{category}: {tip.get('tip', '')} - {tip.get('explanation', '')}")
-        
-        # Extract skills analysis from skills tips
-        skills_tips = ai_result.get("skills", {}).get("tips", [])
+        # Bind each category and its tips once; everything below reuses these locals
+        ats, tone, content, structure, skills = (
+            ai_result.get(category, {})
+            for category in _AI_CATEGORIES
+        )
+        ats_tips = ats.get("tips", [])
+        tone_tips = tone.get("tips", [])
+        content_tips = content.get("tips", [])
+        structure_tips = structure.get("tips", [])
+        skills_tips = skills.get("tips", [])
+        
+        # Improvement tips become recommendations (ATS first, then the other categories)
+        all_recommendations = [f"ATS: {tip.get('tip', '')}" for tip in ats_tips if tip.get("type") == "improve"]
+        for template, tips in zip(
+            _RECOMMENDATION_TEMPLATES.values(),
+            (tone_tips, content_tips, structure_tips, skills_tips)
+        ):
+            all_recommendations += [
+                template.format(tip.get("tip", ""), tip.get("explanation") or "")
+                for tip in tips
+                if tip.get("type") == "improve"
+            ]
+        
+        # Extract skills analysis from skills tips in one pass
         highlighted_skills = []
         missing_skills = []
-        
         for tip in skills_tips:
             tip_text = tip.get("tip", "")
-            if tip.get("type") == "good" and tip_text:
+            if not tip_text:
+                continue
+            tip_type = tip.get("type")
+            if tip_type == "good":
                 highlighted_skills.append(tip_text)
-            elif tip.get("type") == "improve" and tip_text:
+            elif tip_type == "improve":
                 missing_skills.append(tip_text)
         
         # Create a better summary
@@ -83,34 +131,34 @@ def structure_ai_analysis(ai_result: dict) -> dict:
         # Map to our database schema
         return {
             "overall_score": overall_score,
-            "ats_score": ai_result.get("ATS", {}).get("score", 50),
-            "tone_style_score": ai_result.get("toneAndStyle", {}).get("score", 50),
-            "content_score": ai_result.get("content", {}).get("score", 50),
-            "structure_score": ai_result.get("structure", {}).get("score", 50),
-            "skills_score": ai_result.get("skills", {}).get("score", 50),
+            "ats_score": ats.get("score", 50),
+            "tone_style_score": tone.get("score", 50),
+            "content_score": content.get("score", 50),
+            "structure_score": structure.get("score", 50),
+            "skills_score": skills.get("score", 50),
             "tone_style_analysis": {
                 "professionalism": {},
                 "clarity": 0,
                 "confidence_level": 0,
-                "tips": ai_result.get("toneAndStyle", {}).get("tips", [])
+                "tips": tone_tips
             },
             "content_analysis": {
                 "completeness": 0,
                 "relevance": 0,
                 "achievements": [],
-                "tips": ai_result.get("content", {}).get("tips", [])
+                "tips": content_tips
             },
             "structure_analysis": {
                 "formatting": 0,
                 "organization": 0,
                 "readability": 0,
-                "tips": ai_result.get("structure", {}).get("tips", [])
+                "tips": structure_tips
             },
             "skills_analysis": {
                 "highlighted_skills": highlighted_skills,
                 "skill_categories": [],
                 "missing_skills": missing_skills,
-                "tips": ai_result.get("skills", {}).get("tips", [])
+                "tips": skills_tips
             },
             "keyword_matches": {
                 "matching_keywords": [],
@@ -123,12 +171,13 @@ def structure_ai_analysis(ai_result: dict) -> dict:
         }
     except Exception as e:
         print(f"❌ Error structuring AI analysis: {str(e)}")
-        error_result = get_error_analysis(f"Structuring error: {str(e)}")
-        error_result["raw_analysis"] = {"error": str(e), "original_response": ai_result}
-        return error_result
+        return get_error_analysis(
+            f"Structuring error: {str(e)}",
+            {"error": str(e), "original_response": ai_result}
+        )
 
 @timer("get_error_analysis")
-def get_error_analysis(error_message: str) -> dict:
+def get_error_analysis(error_message: str, raw_analysis: Optional[dict] = None) -> dict:
     """Return a standardized error analysis structure"""
     return {
         "overall_score": 50,
@@ -168,7 +217,7 @@ def get_error_analysis(error_message: str) -> dict:
         "skill_gaps": {},
         "recommendations": ["Please try re-analyzing the resume", "Check AI service configuration"],
         "summary": f"Analysis failed: {error_message}",
-        "raw_analysis": None
+        "raw_analysis": raw_analysis
     }
 
 @router.post("/upload", response_model=UploadResponse)
@@ -179,13 +228,14 @@ async def upload_and_analyze_resume(
     job_title: Optional[str] = Form(None),
     job_description: Optional[str] = Form(None),
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db),
+    file_processor: FileProcessor = Depends(get_file_processor),
+    preview_generator: PreviewGenerator = Depends(get_preview_generator)
 ):
     """Upload resume and perform comprehensive AI analysis with caching"""
     
     try:
         # Step 1: Process the uploaded file
-        file_processor = FileProcessor()
         processed_file = await file_processor.process_resume(file, current_user.id)
         
         # Debug: Check what fields are returned
@@ -204,9 +254,10 @@ async def upload_and_analyze_resume(
         if not processed_file.get("extracted_text"):
             raise HTTPException(status_code=400, detail="Could not extract text from resume")
         
-        # Step 2: Save resume to database with timing
+        # Step 2: Save resume to database with timing. Every column but the id is known
+        # here, so INSERT ... RETURNING id replaces the refresh that re-read the whole row
         with timing_context("database_resume_save"):
-            resume = Resume(
+            resume = dict(
                 user_id=current_user.id,
                 filename=processed_file["saved_filename"],
                 file_path=processed_file["file_path"],
@@ -215,15 +266,17 @@ async def upload_and_analyze_resume(
                 original_filename=processed_file["original_filename"],
                 upload_date=datetime.utcnow(),
                 is_active=True,
-                extracted_text=processed_file["extracted_text"]
+                # Inline text only when it could not be spilled to storage
+                extracted_text=None if processed_file["extracted_text_path"] else processed_file["extracted_text"],
+                extracted_text_path=processed_file["extracted_text_path"],
+                extracted_text_preview=processed_file["extracted_text_preview"]
             )
             
-            db.add(resume)
-            db.commit()
-            db.refresh(resume)
+            resume_id = await db.scalar(insert(Resume).values(**resume).returning(Resume.id))
+            await db.commit()
         
         # Step 3: Check cache first before background processing
-        cached_result = resume_cache.get_cached_analysis(
+        cached_result = await resume_cache.get_cached_analysis(
             user_id=str(current_user.id),
             resume_text=processed_file["extracted_text"],
             job_desc=job_description,
@@ -235,9 +288,8 @@ async def upload_and_analyze_resume(
             print("🎯 Cache hit - saving cached analysis to database")
             background_tasks.add_task(
                 save_cached_analysis_to_db,
-                resume.id,
-                cached_result,
-                db
+                resume_id,
+                cached_result
             )
             analysis_status = "completed_cached"
             analysis_message = "Analysis completed instantly using cached results 🚀"
@@ -246,33 +298,30 @@ async def upload_and_analyze_resume(
             print("💥 Cache miss - processing with AI in background")
             background_tasks.add_task(
                 perform_ai_analysis,
-                resume.id,
+                resume_id,
                 processed_file["extracted_text"],
                 job_title,
                 job_description,
-                str(current_user.id),  
-                db
+                str(current_user.id)
             )
             analysis_status = "processing"
             analysis_message = "AI analysis is being processed in the background"
         
-        # Step 4: Generate preview immediately
-        try:
-            preview_generator = PreviewGenerator()
-            preview_path = await preview_generator.generate_preview(resume.file_path)
-            preview_available = True
-        except Exception as e:
-            print(f"⚠️ Preview generation failed: {str(e)}")
-            preview_available = False
+        # Step 4: Render the preview after the response is sent; the preview endpoint
+        # joins an in-flight render (or renders on demand) if it is requested first.
+        # Word documents (and PDFs without PyMuPDF) only ever get a placeholder image
+        preview_available = has_rendered_preview(resume["file_path"])
+        if preview_available:
+            background_tasks.add_task(preview_generator.warm_preview, resume["file_path"])
         
         # Return response with all required fields
         return {
             "resume": {
-                "id": resume.id,
-                "filename": resume.filename,
-                "original_filename": resume.original_filename,
-                "upload_date": resume.upload_date,
-                "file_size": resume.file_size,
+                "id": resume_id,
+                "filename": resume["filename"],
+                "original_filename": resume["original_filename"],
+                "upload_date": resume["upload_date"],
+                "file_size": resume["file_size"],
                 "preview_available": preview_available
             },
             "analysis_result": {
@@ -293,8 +342,7 @@ async def upload_and_analyze_resume(
 @timer("save_cached_analysis_to_db")
 async def save_cached_analysis_to_db(
     resume_id: int, 
-    cached_result: dict,
-    db: Session
+    cached_result: dict
 ):
     """Save cached analysis result to database"""
     try:
@@ -305,7 +353,7 @@ async def save_cached_analysis_to_db(
         
         # Save to database
         with timing_context("database_cached_save"):
-            ai_analysis = AnalysisResult(
+            ai_analysis = dict(
                 resume_id=resume_id,
                 overall_score=structured_analysis["overall_score"],
                 ats_score=structured_analysis["ats_score"],
@@ -327,8 +375,7 @@ async def save_cached_analysis_to_db(
                 analysis_source="cache"  
             )
             
-            db.add(ai_analysis)
-            db.commit()
+            await analysis_writer.save(ai_analysis)
         
         print(f"✅ Cached analysis saved to database for resume {resume_id}")
         
@@ -343,23 +390,46 @@ async def perform_ai_analysis(
     resume_text: str, 
     job_title: Optional[str], 
     job_description: Optional[str],
-    user_id: str,  # Add user_id parameter for caching
-    db: Session  # Receive db session
+    user_id: str  # Add user_id parameter for caching
 ):
-    """Background task to perform AI analysis with caching"""
+    """Background task to perform AI analysis with caching.
+
+    Runs after the response is sent, so it never touches the request's session;
+    results are persisted through analysis_writer with its own sessions.
+    """
     try:
         print(f"🤖 Starting AI analysis for resume {resume_id}")
         print(f"👤 User ID: {user_id}")
         print(f"📋 Job Title: {job_title}")
         print(f"📄 Job Description Length: {len(job_description) if job_description else 0}")
         
-        # Analyze with AI (this will now use caching internally)
-        analysis_result = await gemini_ai_service.analyze_resume_ats(
-            extracted_text=resume_text, 
-            job_title=job_title,
-            job_description=job_description,
-            user_id=user_id  
-        )
+        # Coalesce identical concurrent analyses: only the lock holder calls the AI,
+        # everyone else waits for its result to land in the cache
+        analysis_result = None
+        lock_token = await resume_cache.acquire_analysis_lock(user_id, resume_text, job_description, job_title)
+        if lock_token is None:
+            print(f"⏳ Identical analysis already running, waiting for its result")
+            analysis_result = await resume_cache.wait_for_cached_analysis(
+                user_id, resume_text, job_description, job_title
+            )
+            if analysis_result:
+                analysis_result["source"] = "cache"
+        
+        try:
+            if analysis_result is None:
+                # Callers only schedule this after a cache miss, so skip the second
+                # lookup. Successful results are written back to the cache by the service.
+                analysis_result = await get_gemini_ai_service().analyze_resume_ats(
+                    extracted_text=resume_text, 
+                    job_title=job_title,
+                    job_description=job_description,
+                    user_id=user_id,
+                    check_cache=False
+                )
+        finally:
+            await resume_cache.release_analysis_lock(
+                user_id, resume_text, job_description, job_title, token=lock_token
+            )
         
         source = analysis_result.get("source", "unknown")
         print(f"✅ AI analysis received from {source}. Overall score: {analysis_result.get('overallScore', 'N/A')}")
@@ -371,7 +441,7 @@ async def perform_ai_analysis(
         
         # Save analysis results with timing
         with timing_context("database_analysis_save"):
-            ai_analysis = AnalysisResult(
+            ai_analysis = dict(
                 resume_id=resume_id,
                 overall_score=structured_analysis["overall_score"],
                 ats_score=structured_analysis["ats_score"],
@@ -393,8 +463,7 @@ async def perform_ai_analysis(
                 analysis_source=source  
             )
             
-            db.add(ai_analysis)
-            db.commit()
+            await analysis_writer.save(ai_analysis)
         
         print(f"✅ AI analysis saved to database for resume {resume_id} (source: {source})")
         
@@ -404,7 +473,7 @@ async def perform_ai_analysis(
         # Save error analysis with timing
         try:
             with timing_context("database_error_save"):
-                error_analysis = AnalysisResult(
+                error_analysis = dict(
                     resume_id=resume_id,
                     overall_score=50,
                     ats_score=50,
@@ -425,8 +494,7 @@ async def perform_ai_analysis(
                     analysis_version="1.0",
                     analysis_source="error"
                 )
-                db.add(error_analysis)
-                db.commit()
+                await analysis_writer.save(error_analysis)
             print(f"⚠️ Error analysis saved for resume {resume_id}")
         except Exception as save_error:
             print(f"❌ Could not save error analysis: {str(save_error)}")
@@ -436,21 +504,21 @@ async def perform_ai_analysis(
 async def get_resume_analysis(
     resume_id: int,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Get the latest AI analysis for a resume"""
     with timing_context("database_analysis_query"):
-        resume = db.query(Resume).filter(
-            Resume.id == resume_id,
-            Resume.user_id == current_user.id
-        ).first()
+        resume = await _get_owned_resume(db, resume_id, current_user.id)
         
         if not resume:
             raise HTTPException(status_code=404, detail="Resume not found")
         
-        analysis = db.query(AnalysisResult).filter(
-            AnalysisResult.resume_id == resume_id
-        ).order_by(AnalysisResult.analysis_date.desc()).first()
+        analysis = await db.scalar(
+            select(AnalysisResult)
+            .where(AnalysisResult.resume_id == resume_id)
+            .order_by(AnalysisResult.analysis_date.desc())
+            .limit(1)
+        )
         
         if not analysis:
             raise HTTPException(status_code=404, detail="No analysis found for this resume")
@@ -462,33 +530,27 @@ async def get_resume_analysis(
 async def get_analysis_history(
     resume_id: int,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Get analysis history for a resume"""
     with timing_context("database_history_query"):
-        resume = db.query(Resume).filter(
-            Resume.id == resume_id,
-            Resume.user_id == current_user.id
-        ).first()
+        resume = await _get_owned_resume(db, resume_id, current_user.id, Resume.original_filename)
         
         if not resume:
             raise HTTPException(status_code=404, detail="Resume not found")
         
-        analyses = db.query(AnalysisResult).filter(
-            AnalysisResult.resume_id == resume_id
-        ).order_by(AnalysisResult.analysis_date.desc()).all()
-    
-    # Fix skill_gaps for each analysis if needed
-    fixed_analyses = []
-    for analysis in analyses:
-        analysis_data = AnalysisResultResponse.from_orm(analysis)
-        fixed_analyses.append(analysis_data)
+        analyses = (await db.scalars(
+            select(AnalysisResult)
+            .where(AnalysisResult.resume_id == resume_id)
+            .order_by(AnalysisResult.analysis_date.desc())
+        )).all()
     
+    # Validate every row in one call (the schema also fixes up skill_gaps)
     return AnalysisHistoryResponse(
         resume_id=resume.id,
         resume_filename=resume.original_filename,
         total_analyses=len(analyses),
-        analyses=fixed_analyses
+        analyses=ANALYSIS_RESULT_LIST_ADAPTER.validate_python(analyses, from_attributes=True)
     )
 
 @router.post("/{resume_id}/reanalyze", response_model=ReanalyzeResponse)
@@ -499,25 +561,33 @@ async def reanalyze_resume(
     job_title: Optional[str] = Form(None),
     job_description: Optional[str] = Form(None),
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db),
+    storage_service: SupabaseStorageService = Depends(get_storage_service)
 ):
     """Re-analyze an existing resume with caching"""
     with timing_context("database_reanalyze_query"):
-        resume = db.query(Resume).filter(
-            Resume.id == resume_id,
-            Resume.user_id == current_user.id
-        ).first()
+        resume = await _get_owned_resume(
+            db, resume_id, current_user.id, Resume.extracted_text_path, Resume.extracted_text
+        )
         
         if not resume:
             raise HTTPException(status_code=404, detail="Resume not found")
-        
-        if not resume.extracted_text:
-            raise HTTPException(status_code=400, detail="No text content available for analysis")
+    
+    # Spilled text is fetched from storage; older rows still carry it inline
+    with timing_context("extracted_text_download"):
+        if resume.extracted_text_path:
+            # The storage client is blocking
+            resume_text = await asyncio.to_thread(storage_service.download_text, resume.extracted_text_path)
+        else:
+            resume_text = resume.extracted_text
+    
+    if not resume_text:
+        raise HTTPException(status_code=400, detail="No text content available for analysis")
     
     # Check cache first
-    cached_result = resume_cache.get_cached_analysis(
+    cached_result = await resume_cache.get_cached_analysis(
         user_id=str(current_user.id),
-        resume_text=resume.extracted_text,
+        resume_text=resume_text,
         job_desc=job_description,
         job_title=job_title
     )
@@ -528,8 +598,7 @@ async def reanalyze_resume(
         background_tasks.add_task(
             save_cached_analysis_to_db,
             resume.id,
-            cached_result,
-            db
+            cached_result
         )
         message = "Re-analysis completed instantly using cached results 🚀"
         source = "cache"
@@ -539,11 +608,10 @@ async def reanalyze_resume(
         background_tasks.add_task(
             perform_ai_analysis,
             resume.id,
-            resume.extracted_text,
+            resume_text,
             job_title,
             job_description,
-            str(current_user.id),
-            db
+            str(current_user.id)
         )
         message = "Resume re-analysis started in background"
         source = "api"
@@ -556,41 +624,45 @@ async def reanalyze_resume(
         source=source
     )
 
-@router.get("/list", response_model=ResumeListWrapper)
+# Serialized here in one pydantic-core pass; a response_model would dump and re-validate the
+# result, so the schema is only declared for the docs
+@router.get("/list", response_model=None, responses={200: {"model": ResumeListWrapper}})
 @timer("list_resumes")
 async def list_resumes(
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """List all resumes for current user"""
     with timing_context("database_list_query"):
-        resumes = db.query(Resume).filter(
-            Resume.user_id == current_user.id,
-            Resume.is_active == True
-        ).order_by(Resume.upload_date.desc()).all()
-        
-        # Time the analysis count queries too
-        resume_responses = []
-        for r in resumes:
-            with timing_context("database_analysis_count_query"):
-                has_analysis = db.query(AnalysisResult).filter(
-                    AnalysisResult.resume_id == r.id
-                ).count() > 0
-            
-            resume_responses.append(
-                ResumeListResponse(
-                    id=r.id,
-                    filename=r.filename,
-                    original_filename=r.original_filename,
-                    upload_date=r.upload_date,
-                    file_size=r.file_size,
-                    has_analysis=has_analysis
-                )
+        # One query: the listed columns of each resume with an EXISTS flag for its analyses
+        has_analysis = (
+            exists().where(AnalysisResult.resume_id == Resume.id).label("has_analysis")
+        )
+        rows = (await db.execute(
+            select(
+                Resume.id,
+                Resume.filename,
+                Resume.original_filename,
+                Resume.upload_date,
+                Resume.file_size,
+                has_analysis
+            )
+            .where(
+                Resume.user_id == current_user.id,
+                Resume.is_active == True
             )
+            .order_by(Resume.upload_date.desc())
+        )).all()
+        
+        # Flat, typed columns straight from our own table: build the models without re-validating
+        resume_responses = [ResumeListResponse.model_construct(**row._mapping) for row in rows]
     
-    return ResumeListWrapper(
-        total=len(resume_responses),
-        resumes=resume_responses
+    return Response(
+        content=ResumeListWrapper.model_construct(
+            total=len(resume_responses),
+            resumes=resume_responses
+        ).model_dump_json(),
+        media_type="application/json"
     )
 
 @router.get("/{resume_id}/preview")
@@ -598,80 +670,85 @@ async def list_resumes(
 async def get_resume_preview(
     resume_id: int,
     page: int = 0,
+    width: int = Query(PREVIEW_DEFAULT_WIDTH, ge=PREVIEW_MIN_WIDTH, le=PREVIEW_MAX_WIDTH),
+    if_none_match: Optional[str] = Header(None),
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db),
+    preview_generator: PreviewGenerator = Depends(get_preview_generator)
 ):
     """Get preview image for a resume"""
     with timing_context("database_preview_query"):
-        resume = db.query(Resume).filter(
-            Resume.id == resume_id,
-            Resume.user_id == current_user.id
-        ).first()
+        resume = await _get_owned_resume(db, resume_id, current_user.id, Resume.file_path)
         
         if not resume:
             raise HTTPException(status_code=404, detail="Resume not found")
     
-    preview_generator = PreviewGenerator()
-    return await preview_generator.get_preview_endpoint(resume.file_path, page)
+    return await preview_generator.get_preview_endpoint(resume.file_path, page, width, if_none_match)
 
 @router.get("/{resume_id}/download")
 @timer("download_resume")
 async def download_resume(
     resume_id: int,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db),
+    storage_service: SupabaseStorageService = Depends(get_storage_service)
 ):
     """Download original resume file via signed URL"""
     with timing_context("database_download_query"):
-        resume = db.query(Resume).filter(
-            Resume.id == resume_id,
-            Resume.user_id == current_user.id
-        ).first()
+        resume = await _get_owned_resume(db, resume_id, current_user.id, Resume.file_path)
         
         if not resume:
             raise HTTPException(404, "Resume not found")
     
-    storage_service = SupabaseStorageService()
-    
     print(f"🔗 Creating download URL for: {resume.file_path}")
     
     # Create signed URL
-    signed_url = storage_service.create_signed_url(resume.file_path)
+    signed_url = await storage_service.create_signed_url(resume.file_path)
     
     if not signed_url:
         raise HTTPException(500, f"Failed to generate download URL")
     
-    return RedirectResponse(signed_url)
+    # 307 redirect; let the client reuse the signed URL for a few minutes
+    return RedirectResponse(
+        signed_url,
+        status_code=307,
+        headers={"Cache-Control": "private, max-age=300"}
+    )
 
 @router.delete("/{resume_id}")
 @timer("delete_resume")
 async def delete_resume(
     resume_id: int,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db),
+    storage_service: SupabaseStorageService = Depends(get_storage_service),
+    preview_generator: PreviewGenerator = Depends(get_preview_generator)
 ):
     """Delete resume from storage and database"""
     with timing_context("database_delete_query"):
-        resume = db.query(Resume).filter(
-            Resume.id == resume_id,
-            Resume.user_id == current_user.id
-        ).first()
+        resume = await _get_owned_resume(
+            db, resume_id, current_user.id, Resume.file_path, Resume.extracted_text_path
+        )
         
         if not resume:
             raise HTTPException(404, "Resume not found")
     
-    storage_service = SupabaseStorageService()
+    # Delete the file and its spilled text from Supabase storage in one request
+    storage_paths = [resume.file_path]
+    if resume.extracted_text_path:
+        storage_paths.append(resume.extracted_text_path)
+    remaining_paths = await storage_service.delete_files(storage_paths)
     
-    # Delete from Supabase storage using the correct file path
-    delete_success = await storage_service.delete_file(resume.file_path)
-    
-    if not delete_success:
+    if resume.file_path in remaining_paths:
         raise HTTPException(500, "Failed to delete file from storage")
     
+    # Rendered page images are personal data too
+    await preview_generator.delete_previews(resume.file_path)
+    
     # Delete from database with timing
     with timing_context("database_delete_operation"):
-        db.delete(resume)
-        db.commit()
+        await db.delete(resume)
+        await db.commit()
     
     return {"message": "Resume deleted successfully"}
 
@@ -682,7 +759,7 @@ async def clear_user_cache(
 ):
     """Clear cache for current user (useful after resume improvements)"""
     if resume_cache.enabled:
-        resume_cache.invalidate_user_resumes(str(current_user.id))
+        await resume_cache.invalidate_user_resumes(str(current_user.id))
         return {"message": "Your analysis cache has been cleared. New analyses will use fresh AI results."}
     else:
         return {"message": "Cache is not enabled"}
@@ -697,13 +774,12 @@ async def get_cache_status(
     
     try:
         # Count user's cached analyses
-        user_pattern = f"analysis:{current_user.id}:*"
-        user_keys = resume_cache.redis_client.keys(user_pattern)
+        user_keys = await resume_cache.get_user_cache_keys(str(current_user.id))
         
         return {
             "cache_enabled": True,
             "user_cached_analyses": len(user_keys),
-            "total_cached_analyses": resume_cache.redis_client.dbsize(),
+            "total_cached_analyses": sum((await resume_cache.get_cache_stats()).values()),
             "message": f"You have {len(user_keys)} cached analyses"
         }
     except Exception as e:
@@ -1,38 +1,136 @@
-import redis
-import json
+from redis.asyncio import ConnectionPool, Redis
+import orjson
+import asyncio
+import uuid
 import hashlib
 import logging
+import re
 from typing import Optional, Any
 
 logger = logging.getLogger(__name__)
 
+_WHITESPACE_RE = re.compile(r'\s+')
+
+# Version tag of the fingerprint scheme, so entries from an older scheme miss instead of colliding
+FINGERPRINT_VERSION = "b2"
+
+# Set of user ids that currently have cached analyses
+CACHE_USERS_KEY = "cache:users"
+
+# RedisBloom filter of registered usernames, emails and hashed SA IDs
+USERS_BLOOM_KEY = "users_bloom"
+
+# Set once the bloom filter holds every existing user; until then it cannot rule anything out
+USERS_BLOOM_READY_KEY = "users_bloom:ready"
+
+# Claimed by the one worker (re)building the bloom filter; expires if that worker dies mid-fill
+USERS_BLOOM_FILL_LOCK_KEY = "users_bloom:filling"
+USERS_BLOOM_FILL_LOCK_TTL = 300
+
+# Server-side aggregation of per-user index sizes: KEYS[1] is the users set and
+# KEYS[i + 1] the index of user ARGV[i]; returns a flat [user_id, count, ...] list,
+# pruning users whose index has expired
+CACHE_STATS_SCRIPT = """
+local result = {}
+for i, user_id in ipairs(ARGV) do
+    local count = redis.call('SCARD', KEYS[i + 1])
+    if count > 0 then
+        result[#result + 1] = user_id
+        result[#result + 1] = count
+    else
+        redis.call('SREM', KEYS[1], user_id)
+    end
+end
+return result
+"""
+
+# Atomic per-user invalidation of the analysis keys passed as KEYS[4..] (the caller's
+# read of the index in KEYS[1]). Returns -1 without deleting anything if the index
+# changed since that read; otherwise UNLINKs the keys (in batches to stay under Lua's
+# unpack limit), then the tracking sets, and returns the number of keys removed
+INVALIDATE_USER_SCRIPT = """
+local indexed = #KEYS - 3
+if redis.call('SCARD', KEYS[1]) ~= indexed then
+    return -1
+end
+for i = 4, #KEYS do
+    if redis.call('SISMEMBER', KEYS[1], KEYS[i]) == 0 then
+        return -1
+    end
+end
+local removed = 0
+for i = 4, #KEYS, 1000 do
+    removed = removed + redis.call('UNLINK', unpack(KEYS, i, math.min(i + 999, #KEYS)))
+end
+redis.call('UNLINK', KEYS[1], KEYS[2])
+redis.call('SREM', KEYS[3], ARGV[1])
+return removed
+"""
+
+# Attempts at the invalidation script before giving up on a user whose index keeps changing
+INVALIDATE_USER_ATTEMPTS = 3
+
+# How long a Gemini analysis stays cached (seconds)
+ANALYSIS_CACHE_TTL = 7 * 86400
+
+# Text extracted from an uploaded file is reused for identical re-uploads this long (seconds)
+EXTRACTED_TEXT_TTL = 86400
+
+# Lifetime of the lock that coalesces identical concurrent analyses
+ANALYSIS_LOCK_TTL_MS = 60000
+
+# Delete a lock only if it still holds the caller's token
+RELEASE_LOCK_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
 
 class ResumeCache:
     def __init__(self):
-        """Initialize Redis connection and cache settings"""
-        try:
-            # Codespaces Redis connection
-            self.redis_client = redis.Redis(
-                host='localhost', 
-                port=6379, 
-                db=0, 
-                decode_responses=True,
-                socket_connect_timeout=3
-            )
-            self.redis_client.ping() #Test connection
+        """Set up the pooled async Redis client; connectivity is checked in connect()"""
+        # Codespaces Redis connection
+        self._pool = ConnectionPool(
+            host='localhost', 
+            port=6379, 
+            db=0, 
+            max_connections=32,
+            decode_responses=False,  # raw bytes go straight into orjson
+            socket_connect_timeout=3
+        )
+        self.redis_client = Redis(connection_pool=self._pool)
+        self._cache_stats_script = self.redis_client.register_script(CACHE_STATS_SCRIPT)
+        self._invalidate_user_script = self.redis_client.register_script(INVALIDATE_USER_SCRIPT)
+        self._release_lock_script = self.redis_client.register_script(RELEASE_LOCK_SCRIPT)
+        self.enabled = False
+        self.DEFAULT_JOB_TITLE = "not_specified"
+        self.DEFAULT_JOB_DESC = "not_specified"
+
+    async def connect(self):
+        """Ping Redis once at application startup and enable the cache if it answers"""
+        try:
+            await self.redis_client.ping() #Test connection
             self.enabled = True
-            self.DEFAULT_JOB_TITLE = "not_specified"
-            self.DEFAULT_JOB_DESC = "not_specified"
             logger.info("✅ Redis cache enabled")
         except Exception as e:
             self.enabled = False
             logger.warning(f"❌ Redis disabled: {e}")
 
+    async def close(self):
+        await self.redis_client.aclose()
+
     def _get_resume_fingerprint(self, resume_text: str) -> str:
         """Create a unique fingerprint of the resume content"""
-        normalized = resume_text.lower().strip()
-        normalized = ' '.join(normalized.split())  # Remove extra whitespace
-        return hashlib.md5(normalized.encode()).hexdigest()
+        # Collapse whitespace runs in one C-level pass (same result as ' '.join(text.split()))
+        normalized = _WHITESPACE_RE.sub(' ', resume_text.lower()).strip()
+        return self._fingerprint(normalized)
+
+    @staticmethod
+    def _fingerprint(text: str) -> str:
+        """Fast 128-bit content fingerprint (BLAKE2b is several times faster than MD5 in CPython)"""
+        return hashlib.blake2b(text.encode(), digest_size=16).hexdigest()
 
     def _normalize_job_fields(self, job_title: str = None, job_desc: str = None) -> tuple:
         """Normalize optional job fields to consistent values"""
@@ -40,24 +138,75 @@ class ResumeCache:
         job_desc = job_desc.strip() if job_desc and job_desc.strip() else self.DEFAULT_JOB_DESC
         return job_title, job_desc
 
-    def get_cached_analysis(self, user_id: str, resume_text: str, job_desc: str = None, job_title: str = None) -> Optional[dict]:
-        """Get cached analysis with user_id and optional job fields"""
+    @staticmethod
+    def _user_index_key(user_id: str) -> str:
+        """Key of the set holding every analysis cache key written for a user"""
+        return f"user_cache_index:{user_id}"
+
+    def _analysis_cache_key(self, user_id: str, resume_text: str, job_desc: str = None, job_title: str = None) -> tuple:
+        """Build the analysis cache key; returns (cache_key, resume_fingerprint)"""
+        # Normalize optional fields
+        job_title, job_desc = self._normalize_job_fields(job_title, job_desc)
+        
+        # Generate cache key with user_id
+        resume_fingerprint = self._get_resume_fingerprint(resume_text)
+        job_fingerprint = self._fingerprint(f"{job_title}_{job_desc}")
+        cache_key = f"analysis:{user_id}:{FINGERPRINT_VERSION}:{resume_fingerprint}:{job_fingerprint}"
+        return cache_key, resume_fingerprint
+
+    async def acquire_analysis_lock(self, user_id: str, resume_text: str, job_desc: str = None, job_title: str = None, ttl_ms: int = ANALYSIS_LOCK_TTL_MS) -> Optional[str]:
+        """Claim an analysis; returns a release token, or None if an identical analysis is already running.
+
+        Without Redis there is nothing to coordinate on, so an empty token lets the caller proceed.
+        """
         if not self.enabled:
+            return ""
+            
+        try:
+            cache_key, _ = self._analysis_cache_key(user_id, resume_text, job_desc, job_title)
+            token = uuid.uuid4().hex
+            if await self.redis_client.set(f"lock:{cache_key}", token, nx=True, px=ttl_ms):
+                return token
             return None
             
+        except Exception as e:
+            logger.error(f"Analysis lock error: {e}")
+            return ""
+
+    async def release_analysis_lock(self, user_id: str, resume_text: str, job_desc: str = None, job_title: str = None, token: str = ""):
+        """Release a lock taken by acquire_analysis_lock if it is still held by this token"""
+        if not self.enabled or not token:
+            return
+            
         try:
-            # Normalize optional fields
-            job_title, job_desc = self._normalize_job_fields(job_title, job_desc)
+            cache_key, _ = self._analysis_cache_key(user_id, resume_text, job_desc, job_title)
+            await self._release_lock_script(keys=[f"lock:{cache_key}"], args=[token])
+        except Exception as e:
+            logger.error(f"Analysis lock release error: {e}")
+
+    async def wait_for_cached_analysis(self, user_id: str, resume_text: str, job_desc: str = None, job_title: str = None, timeout: float = ANALYSIS_LOCK_TTL_MS / 1000, interval: float = 0.25) -> Optional[dict]:
+        """Poll the cache for the result of an identical analysis running in another worker"""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while loop.time() < deadline:
+            await asyncio.sleep(interval)
+            cached = await self.get_cached_analysis(user_id, resume_text, job_desc, job_title)
+            if cached:
+                return cached
+        return None
+
+    async def get_cached_analysis(self, user_id: str, resume_text: str, job_desc: str = None, job_title: str = None) -> Optional[dict]:
+        """Get cached analysis with user_id and optional job fields"""
+        if not self.enabled:
+            return None
             
-            # Generate cache key with user_id
-            resume_fingerprint = self._get_resume_fingerprint(resume_text)
-            job_fingerprint = hashlib.md5(f"{job_title}_{job_desc}".encode()).hexdigest()
-            cache_key = f"analysis:{user_id}:{resume_fingerprint}:{job_fingerprint}"
+        try:
+            cache_key, resume_fingerprint = self._analysis_cache_key(user_id, resume_text, job_desc, job_title)
             
-            cached = self.redis_client.get(cache_key)
+            cached = await self.redis_client.get(cache_key)
             if cached:
                 logger.info(f"🎯 Cache HIT for user {user_id}")
-                return json.loads(cached)
+                return orjson.loads(cached)
                 
             logger.info(f"💥 Cache MISS for user {user_id}")
             return None
@@ -66,54 +215,261 @@ class ResumeCache:
             logger.error(f"Cache get error: {e}")
             return None
 
-    def set_cached_analysis(self, user_id: str, resume_text: str, job_desc: str = None, job_title: str = None, analysis_result: dict = None, ttl: int = 86400):
+    async def set_cached_analysis(self, user_id: str, resume_text: str, job_desc: str = None, job_title: str = None, analysis_result: dict = None, ttl: int = ANALYSIS_CACHE_TTL):
         """Cache analysis result with user_id and optional job fields"""
         if not self.enabled or not analysis_result:
             return
             
         try:
-            # Normalize optional fields
-            job_title, job_desc = self._normalize_job_fields(job_title, job_desc)
-            
-            # Generate cache key with user_id
-            resume_fingerprint = self._get_resume_fingerprint(resume_text)
-            job_fingerprint = hashlib.md5(f"{job_title}_{job_desc}".encode()).hexdigest()
-            cache_key = f"analysis:{user_id}:{resume_fingerprint}:{job_fingerprint}"
+            cache_key, resume_fingerprint = self._analysis_cache_key(user_id, resume_text, job_desc, job_title)
             
-            # Store the analysis
-            self.redis_client.setex(cache_key, ttl, json.dumps(analysis_result))
+            # Store the analysis and index the key per user so lookups never need KEYS;
+            # one round trip, without MULTI/EXEC since the writes need not be atomic
+            index_key = self._user_index_key(user_id)
+            pipe = self.redis_client.pipeline(transaction=False)
+            pipe.setex(cache_key, ttl, orjson.dumps(analysis_result))
+            pipe.sadd(index_key, cache_key)
+            pipe.expire(index_key, ttl)
+            pipe.sadd(CACHE_USERS_KEY, user_id)
             
             # Track user-resume relationship for easy invalidation
-            user_resumes_key = f"user_resumes:{user_id}"
-            self.redis_client.sadd(user_resumes_key, resume_fingerprint)
+            pipe.sadd(f"user_resumes:{user_id}", resume_fingerprint)
+            await pipe.execute()
             
             logger.info(f"💾 Cached analysis for user {user_id}")
             
         except Exception as e:
             logger.error(f"Cache set error: {e}")
 
-    def invalidate_user_resumes(self, user_id: str):
-        """Clear ALL cached analyses for a user"""
+    async def get_signed_url(self, file_path: str) -> Optional[str]:
+        """Return a previously minted signed URL for a storage path"""
+        if not self.enabled:
+            return None
+            
+        try:
+            signed_url = await self.redis_client.get(f"signed_url:{file_path}")
+            return signed_url.decode() if signed_url else None
+        except Exception as e:
+            logger.error(f"Signed URL cache get error: {e}")
+            return None
+
+    async def set_signed_url(self, file_path: str, signed_url: str, ttl: int):
+        """Cache a signed URL for slightly less than its validity window"""
+        if not self.enabled or ttl <= 0:
+            return
+            
+        try:
+            await self.redis_client.setex(f"signed_url:{file_path}", ttl, signed_url)
+        except Exception as e:
+            logger.error(f"Signed URL cache set error: {e}")
+
+    async def get_extracted_text(self, content_hash: str) -> Optional[str]:
+        """Return text previously extracted from a file with the same content hash"""
+        if not self.enabled:
+            return None
+            
+        try:
+            extracted_text = await self.redis_client.get(f"extracted_text:{content_hash}")
+            return extracted_text.decode() if extracted_text is not None else None
+        except Exception as e:
+            logger.error(f"Extracted text cache get error: {e}")
+            return None
+
+    async def set_extracted_text(self, content_hash: str, extracted_text: str, ttl: int = EXTRACTED_TEXT_TTL):
+        """Remember the text extracted from a file, keyed by its content hash"""
+        if not self.enabled:
+            return
+            
+        try:
+            await self.redis_client.setex(f"extracted_text:{content_hash}", ttl, extracted_text)
+        except Exception as e:
+            logger.error(f"Extracted text cache set error: {e}")
+
+    async def revoke_token(self, token_hash: str, ttl: int):
+        """Deny a logged-out token until it would have expired anyway"""
+        if not self.enabled or ttl <= 0:
+            return
+            
+        try:
+            await self.redis_client.setex(f"revoked_token:{token_hash}", ttl, 1)
+        except Exception as e:
+            logger.error(f"Token revoke error: {e}")
+
+    async def is_token_revoked(self, token_hash: str) -> bool:
+        """Check the logout denylist"""
+        if not self.enabled:
+            return False
+            
+        try:
+            return bool(await self.redis_client.exists(f"revoked_token:{token_hash}"))
+        except Exception as e:
+            logger.error(f"Token revoke check error: {e}")
+            return False
+
+    async def mark_user_changed(self, user_id: int, changed_at: float, ttl: int):
+        """Record when a user's row changed, so every worker drops its cached copy"""
         if not self.enabled:
             return
             
         try:
-            user_resumes_key = f"user_resumes:{user_id}"
-            resume_fingerprints = self.redis_client.smembers(user_resumes_key)
+            await self.redis_client.setex(f"user_changed:{user_id}", ttl, changed_at)
+        except Exception as e:
+            logger.error(f"User change mark error: {e}")
+
+    async def get_token_auth_state(self, token_hash: str, user_id: int) -> tuple:
+        """(token revoked, time the user's row last changed or None) in one round trip"""
+        if not self.enabled:
+            return False, None
             
-            # Delete all analysis cache entries for this user
-            for fingerprint in resume_fingerprints:
-                pattern = f"analysis:{user_id}:{fingerprint}:*"
-                keys = self.redis_client.keys(pattern)
-                if keys:
-                    self.redis_client.delete(*keys)
+        try:
+            revoked, changed_at = await self.redis_client.mget(
+                f"revoked_token:{token_hash}", f"user_changed:{user_id}"
+            )
+            return revoked is not None, float(changed_at) if changed_at is not None else None
+        except Exception as e:
+            logger.error(f"Token auth state error: {e}")
+            return False, None
+
+    async def reserve_users_bloom(self, error_rate: float = 0.001, capacity: int = 1_000_000) -> bool:
+        """(Re)create the registration bloom filter; True only for the one caller that must fill it"""
+        if not self.enabled:
+            return False
+            
+        try:
+            if await self.redis_client.exists(USERS_BLOOM_KEY, USERS_BLOOM_READY_KEY) == 2:
+                return False
+            if not await self.redis_client.set(USERS_BLOOM_FILL_LOCK_KEY, 1, nx=True, ex=USERS_BLOOM_FILL_LOCK_TTL):
+                return False  # Another worker is filling it
+        except Exception as e:
+            logger.error(f"Users bloom reserve error: {e}")
+            return False
+        
+        try:
+            # Drop any partial filter (a fill that died, or an evicted ready marker) and start over
+            await self.redis_client.delete(USERS_BLOOM_KEY, USERS_BLOOM_READY_KEY)
+            await self.redis_client.execute_command("BF.RESERVE", USERS_BLOOM_KEY, error_rate, capacity)
+            return True
+        except Exception as e:
+            # RedisBloom is not loaded
+            logger.info(f"Users bloom filter not reserved: {e}")
+            await self.redis_client.delete(USERS_BLOOM_FILL_LOCK_KEY)
+            return False
+
+    async def mark_users_bloom_ready(self):
+        """Record that the bloom filter now covers every existing user"""
+        if not self.enabled:
+            return
+            
+        try:
+            await self.redis_client.set(USERS_BLOOM_READY_KEY, 1)
+            await self.redis_client.delete(USERS_BLOOM_FILL_LOCK_KEY)
+        except Exception as e:
+            logger.error(f"Users bloom ready mark error: {e}")
+
+    async def users_bloom_might_contain(self, *items: str) -> Optional[bool]:
+        """False only if none of the items was ever added; True when unsure or unavailable.
+
+        None when the filter is missing or not fully filled (e.g. after a Redis restart
+        or eviction): treat it as "might contain" and refill it.
+        """
+        if not self.enabled:
+            return True
+            
+        try:
+            pipe = self.redis_client.pipeline(transaction=False)
+            pipe.exists(USERS_BLOOM_KEY, USERS_BLOOM_READY_KEY)
+            pipe.execute_command("BF.MEXISTS", USERS_BLOOM_KEY, *items)
+            present, seen = await pipe.execute()
+            if present != 2:
+                return None
+            return any(seen)
+        except Exception as e:
+            logger.error(f"Users bloom check error: {e}")
+            return True
+
+    async def add_to_users_bloom(self, *items: str):
+        """Record registered identifiers in the bloom filter"""
+        if not self.enabled or not items:
+            return
+            
+        try:
+            # NOCREATE: a missing filter must be rebuilt at full capacity by the refill,
+            # not recreated empty with BF.MADD's defaults
+            await self.redis_client.execute_command("BF.INSERT", USERS_BLOOM_KEY, "NOCREATE", "ITEMS", *items)
+        except Exception as e:
+            logger.error(f"Users bloom add error: {e}")
+
+    async def get_user_cache_keys(self, user_id: str) -> list:
+        """Return the live analysis cache keys for a user, pruning expired index entries"""
+        if not self.enabled:
+            return []
+            
+        try:
+            index_key = self._user_index_key(user_id)
+            indexed_keys = list(await self.redis_client.smembers(index_key))
+            if not indexed_keys:
+                return []
+            
+            pipe = self.redis_client.pipeline(transaction=False)
+            for key in indexed_keys:
+                pipe.exists(key)
+            alive = await pipe.execute()
+            
+            live_keys = [key for key, exists in zip(indexed_keys, alive) if exists]
+            expired_keys = [key for key, exists in zip(indexed_keys, alive) if not exists]
+            if expired_keys:
+                await self.redis_client.srem(index_key, *expired_keys)
+            return live_keys
+            
+        except Exception as e:
+            logger.error(f"User cache keys error: {e}")
+            return []
+
+    async def get_cache_stats(self) -> dict:
+        """Count indexed analyses per user without scanning the keyspace"""
+        if not self.enabled:
+            return {}
+            
+        try:
+            user_ids = [user_id.decode() for user_id in await self.redis_client.smembers(CACHE_USERS_KEY)]
+            if not user_ids:
+                return {}
+            
+            flat = await self._cache_stats_script(
+                keys=[CACHE_USERS_KEY, *(self._user_index_key(user_id) for user_id in user_ids)],
+                args=user_ids
+            )
+            return {flat[i].decode(): int(flat[i + 1]) for i in range(0, len(flat), 2)}
+            
+        except Exception as e:
+            logger.error(f"Cache stats error: {e}")
+            return {}
+
+    async def invalidate_user_resumes(self, user_id: str) -> int:
+        """Clear ALL cached analyses for a user, returning the number of entries removed"""
+        if not self.enabled:
+            return 0
+            
+        try:
+            index_key = self._user_index_key(user_id)
+            for _ in range(INVALIDATE_USER_ATTEMPTS):
+                # The script deletes only if the index still holds exactly these keys,
+                # so nothing written between this read and the delete can be missed
+                indexed_keys = list(await self.redis_client.smembers(index_key))
+                removed = await self._invalidate_user_script(
+                    keys=[index_key, f"user_resumes:{user_id}", CACHE_USERS_KEY, *indexed_keys],
+                    args=[user_id]
+                )
+                if removed >= 0:
+                    logger.info(f"🗑️ Cleared {removed} cached analyses for user {user_id}")
+                    return removed
             
-            # Clear the user's resume set
-            self.redis_client.delete(user_resumes_key)
-            logger.info(f"🗑️ Cleared all cached analyses for user {user_id}")
+            logger.warning(f"Cache index for user {user_id} kept changing; invalidation skipped")
+            return 0
             
         except Exception as e:
             logger.error(f"Cache invalidation error: {e}")
+            return 0
 
 # Global cache instance
 resume_cache = ResumeCache()
\ No newline at end of file
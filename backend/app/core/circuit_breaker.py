@@ -0,0 +1,56 @@
+import logging
+import time
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+
+class CircuitBreaker:
+    """Stops calling a failing dependency for a cooldown after consecutive failures.
+
+    While closed, calls go through. After fail_max consecutive failures the circuit opens and
+    allow() refuses calls for reset_timeout seconds; then one trial call is let through per
+    cooldown, and its outcome closes the circuit or keeps it open. Used from the event loop only.
+    """
+
+    def __init__(self, name: str, fail_max: int = 5, reset_timeout: float = 60):
+        self.name = name
+        self.fail_max = fail_max
+        self.reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+
+    @property
+    def state(self) -> str:
+        return "closed" if self._opened_at is None else "open"
+
+    def allow(self) -> bool:
+        """Whether a call may go out now"""
+        if self._opened_at is None:
+            return True
+
+        now = time.monotonic()
+        if now - self._opened_at >= self.reset_timeout:
+            # Let this call through as a trial and restart the cooldown for everyone else
+            self._opened_at = now
+            return True
+        return False
+
+    def record_success(self) -> None:
+        if self._opened_at is not None:
+            logger.info("Circuit %s closed", self.name)
+        self._failures = 0
+        self._opened_at = None
+
+    def record_failure(self) -> None:
+        self._failures += 1
+        if self._opened_at is None and self._failures >= self.fail_max:
+            logger.warning("Circuit %s opened after %d consecutive failures", self.name, self._failures)
+            self._opened_at = time.monotonic()
+        elif self._opened_at is not None:
+            # A failed trial call: stay open for another cooldown
+            self._opened_at = time.monotonic()
+
+    def snapshot(self) -> dict:
+        """State for the metrics endpoint"""
+        return {"state": self.state, "consecutive_failures": self._failures}
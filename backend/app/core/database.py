@@ -1,34 +1,87 @@
-from sqlalchemy import create_engine
+import os
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from sqlalchemy.pool import NullPool
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
 from app.core.config import settings
 
+
+def _async_database_url(url: str) -> str:
+    """Point plain Postgres URLs at the asyncpg driver"""
+    for prefix in ("postgresql://", "postgres://"):
+        if url.startswith(prefix):
+            return "postgresql+asyncpg://" + url[len(prefix):]
+    return url
+
 # Database URL from settings
-SQLALCHEMY_DATABASE_URL = settings.DATABASE_URL
+SQLALCHEMY_DATABASE_URL = _async_database_url(settings.DATABASE_URL)
+
+# Transaction-mode poolers (PgBouncer on 6432, Supabase's pooler on 6543)
+# own the connection pool, so the app must not keep its own on top of them
+TRANSACTION_POOLER_PORTS = {6432, 6543}
+USES_TRANSACTION_POOLER = make_url(SQLALCHEMY_DATABASE_URL).port in TRANSACTION_POOLER_PORTS
 
-# Sync database engine with optimized pool settings
-engine = create_engine(
+if USES_TRANSACTION_POOLER:
+    # Prepared statement caches (asyncpg's and SQLAlchemy's) break when
+    # consecutive statements land on different server connections
+    engine = create_async_engine(
+        SQLALCHEMY_DATABASE_URL,
+        poolclass=NullPool,
+        query_cache_size=1200,
+        insertmanyvalues_page_size=1000,
+        connect_args={"statement_cache_size": 0, "prepared_statement_cache_size": 0}
+    )
+else:
+    # Async database engine (asyncpg) for the request path, sized for burst upload/login
+    # traffic; a short pool_timeout fails fast instead of queueing behind a saturated pool
+    engine = create_async_engine(
+        SQLALCHEMY_DATABASE_URL,
+        pool_pre_ping=True,
+        pool_recycle=300,
+        pool_size=int(os.getenv("DB_POOL_SIZE", 20)),
+        max_overflow=int(os.getenv("DB_MAX_OVERFLOW", 40)),
+        pool_timeout=float(os.getenv("DB_POOL_TIMEOUT", 2)),
+        query_cache_size=1200,
+        insertmanyvalues_page_size=1000
+    )
+
+# Background work (analysis writes, startup jobs) opens a fresh connection per unit
+# of work so it never holds request-path pool slots or idles connections between tasks
+bg_engine = create_async_engine(
     SQLALCHEMY_DATABASE_URL,
-    pool_pre_ping=True,
-    pool_recycle=300,
-    pool_size=5,
-    max_overflow=10
+    poolclass=NullPool,
+    query_cache_size=1200,
+    insertmanyvalues_page_size=1000,
+    connect_args={"statement_cache_size": 0, "prepared_statement_cache_size": 0} if USES_TRANSACTION_POOLER else {}
 )
 
-# Create a configured "Session" class
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# Create a configured "AsyncSession" class. Objects stay loaded after commit
+# so response models can read them without lazy-loading on a closed session
+SessionLocal = async_sessionmaker(bind=engine, autoflush=False, expire_on_commit=False)
+BgSessionLocal = async_sessionmaker(bind=bg_engine, autoflush=False, expire_on_commit=False)
+
+
+def pool_status() -> dict:
+    """Request-path pool usage, for spotting saturation"""
+    pool = engine.sync_engine.pool
+    if isinstance(pool, NullPool):
+        return {"pool": "null"}
+    return {
+        "pool": "queue",
+        "size": pool.size(),
+        "checked_out": pool.checkedout(),
+        "overflow": pool.overflow(),
+        "checked_in": pool.checkedin()
+    }
 
 # Base class for declarative models
 Base = declarative_base()
 
 # Dependency to get DB session
-def get_db():
+async def get_db():
     """
-    Provide a database session to path operations.
+    Provide an async database session to path operations.
     Closes the session after use.
     """
-    db = SessionLocal()
-    try:
+    async with SessionLocal() as db:
         yield db
-    finally:
-        db.close()
\ No newline at end of file
@@ -0,0 +1,31 @@
+import logging
+import os
+import queue
+from logging.handlers import QueueHandler, QueueListener
+
+# Root log level; DEBUG also emits the per-step storage and preview messages
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+
+
+def start_queue_logging() -> QueueListener:
+    """Route root log records through a queue so request handlers only enqueue them.
+
+    The root logger's existing handlers (or a stderr StreamHandler if there are none)
+    are moved behind a QueueListener that does the formatting and I/O on its own thread.
+    """
+    root = logging.getLogger()
+    root.setLevel(LOG_LEVEL)
+    handlers = [h for h in root.handlers if not isinstance(h, QueueHandler)]
+    for handler in handlers:
+        root.removeHandler(handler)
+    
+    log_queue = queue.SimpleQueue()
+    root.addHandler(QueueHandler(log_queue))
+    
+    listener = QueueListener(
+        log_queue,
+        *(handlers or [logging.StreamHandler()]),
+        respect_handler_level=True
+    )
+    listener.start()
+    return listener
@@ -1,71 +1,131 @@
 import time
 import functools
 import logging
-from typing import Dict, Any, Callable
+from array import array
+from typing import Dict, Any, Callable, List, Tuple
 from contextlib import contextmanager
 import asyncio
 
 logger = logging.getLogger(__name__)
 
-# Global performance metrics storage
-performance_metrics: Dict[str, list] = {}
+# Histogram layout: 1000 buckets of 10 ms cover 0-10 s; slower calls share the last bucket
+HISTOGRAM_BUCKETS = 1000
+HISTOGRAM_BUCKET_WIDTH_NS = 10_000_000
+
+class FixedWidthHistogram:
+    """Streaming duration histogram with constant memory (~8 kB) per metric.
+
+    Durations are recorded in nanoseconds; quantiles are resolved to a bucket's
+    upper edge, clamped to the largest value seen (which is also what quantiles
+    landing in the overflow bucket report).
+    """
+    __slots__ = ('buckets', 'count', 'sum', 'min', 'max', 'width')
+
+    def __init__(self, buckets: int = HISTOGRAM_BUCKETS, width: int = HISTOGRAM_BUCKET_WIDTH_NS):
+        self.buckets = array('Q', bytes(8 * buckets))
+        self.width = width
+        self.reset()
+
+    def reset(self):
+        """Drop all recorded durations, keeping the bucket array"""
+        for index in range(len(self.buckets)):
+            self.buckets[index] = 0
+        self.count = 0
+        self.sum = 0
+        self.min = None
+        self.max = None
+
+    def add(self, duration_ns: int):
+        """Record one duration"""
+        last = len(self.buckets) - 1
+        index = duration_ns // self.width
+        self.buckets[index if index < last else last] += 1
+        self.count += 1
+        self.sum += duration_ns
+        if self.min is None or duration_ns < self.min:
+            self.min = duration_ns
+        if self.max is None or duration_ns > self.max:
+            self.max = duration_ns
+
+    def quantile(self, q: float) -> int:
+        """Approximate q-quantile in nanoseconds (0 when empty)"""
+        return self.quantiles((q,))[0]
+
+    def quantiles(self, qs: Tuple[float, ...]) -> List[int]:
+        """Approximate quantiles for ascending qs in one pass over the buckets"""
+        if not self.count:
+            return [0] * len(qs)
+        results = []
+        targets = iter(q * self.count for q in qs)
+        target = next(targets)
+        last = len(self.buckets) - 1
+        seen = 0
+        for index, bucket_count in enumerate(self.buckets):
+            seen += bucket_count
+            while seen >= target:
+                # The overflow bucket has no upper edge; report the largest value seen
+                results.append(min((index + 1) * self.width, self.max) if index < last else self.max)
+                target = next(targets, None)
+                if target is None:
+                    return results
+        return results + [self.max] * (len(qs) - len(results))
+
+# Global performance metrics storage: one histogram per metric name
+performance_metrics: Dict[str, FixedWidthHistogram] = {}
+
+# Per-metric record functions, built once so the timed call paths skip all lookups
+_recorders: Dict[str, Callable[[int], None]] = {}
+
+def _recorder(metric_name: str) -> Callable[[int], None]:
+    """Return the function that stores one duration (in nanoseconds) for a metric"""
+    record = _recorders.get(metric_name)
+    if record is None:
+        histogram = performance_metrics.setdefault(metric_name, FixedWidthHistogram())
+        add = histogram.add
+        
+        def record(duration_ns: int):
+            add(duration_ns)
+            if logger.isEnabledFor(logging.INFO):
+                logger.info("⏱️ %s: %.3fs", metric_name, duration_ns * 1e-9)
+        
+        _recorders[metric_name] = record
+    return record
 
 def timer(metric_name: str):
     """
-    Decorator to measure function execution time and store metrics
-    FIXED: Properly handles both sync and async functions
+    Decorator to measure function execution time and store metrics.
+    Picks the sync or async wrapper once, at decoration time.
     """
     def decorator(func: Callable):
         """
         Decorator function
         """
-        @functools.wraps(func)
-        async def async_wrapper(*args, **kwargs):
-            """"
-            Wrapper for asynchronous functions
-            """
-            start_time = time.perf_counter()
-            try:
-                result = await func(*args, **kwargs)
-                return result
-            finally:
-                end_time = time.perf_counter()
-                duration = end_time - start_time
-                
-                # Store metric
-                if metric_name not in performance_metrics:
-                    performance_metrics[metric_name] = []
-                performance_metrics[metric_name].append(duration)
-                
-                logger.info(f"⏱️ {metric_name}: {duration:.3f}s")
+        record = _recorder(metric_name)
+        
+        if asyncio.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                """
+                Wrapper for asynchronous functions
+                """
+                start_ns = time.perf_counter_ns()
+                try:
+                    return await func(*args, **kwargs)
+                finally:
+                    record(time.perf_counter_ns() - start_ns)
+            return async_wrapper
         
         @functools.wraps(func)
         def sync_wrapper(*args, **kwargs):
             """
             Wrapper for synchronous functions
-
             """
-
-            start_time = time.perf_counter()
+            start_ns = time.perf_counter_ns()
             try:
-                result = func(*args, **kwargs)
-                return result
+                return func(*args, **kwargs)
             finally:
-                end_time = time.perf_counter()
-                duration = end_time - start_time
-                
-                # Store metric
-                if metric_name not in performance_metrics:
-                    performance_metrics[metric_name] = []
-                performance_metrics[metric_name].append(duration)
-                
-                logger.info(f"⏱️ {metric_name}: {duration:.3f}s")
-        
-        # Return the appropriate wrapper
-        if hasattr(func, '__await__') or asyncio.iscoroutinefunction(func):
-            return async_wrapper
-        else:
-            return sync_wrapper
+                record(time.perf_counter_ns() - start_ns)
+        return sync_wrapper
     return decorator
 
 @contextmanager
@@ -73,34 +133,37 @@ def timing_context(metric_name: str):
     """
     Context manager for timing code blocks
     """
-    start_time = time.perf_counter()
+    record = _recorder(metric_name)
+    start_ns = time.perf_counter_ns()
     try:
         yield
     finally:
-        end_time = time.perf_counter()
-        duration = end_time - start_time
-        
-        if metric_name not in performance_metrics:
-            performance_metrics[metric_name] = []
-        performance_metrics[metric_name].append(duration)
-        
-        logger.info(f"⏱️ {metric_name}: {duration:.3f}s")
+        record(time.perf_counter_ns() - start_ns)
+
+# Quantiles reported per metric, resolved together in a single bucket walk
+SUMMARY_QUANTILES = (0.5, 0.95, 0.99)
 
 def get_performance_summary() -> Dict[str, Any]:
-    """Get summary statistics for all performance metrics"""
+    """Get summary statistics for all performance metrics (in seconds)"""
     summary = {}
-    for metric_name, durations in performance_metrics.items():
-        if durations:
-            summary[metric_name] = {
-                "count": len(durations),
-                "avg": sum(durations) / len(durations),
-                "min": min(durations),
-                "max": max(durations),
-                "p95": sorted(durations)[int(len(durations) * 0.95)] if len(durations) > 1 else durations[0],
-                "total": sum(durations)
-            }
+    for metric_name, histogram in performance_metrics.items():
+        if not histogram.count:
+            continue
+        p50, p95, p99 = histogram.quantiles(SUMMARY_QUANTILES)
+        summary[metric_name] = {
+            "count": histogram.count,
+            "avg": histogram.sum / histogram.count * 1e-9,
+            "min": histogram.min * 1e-9,
+            "max": histogram.max * 1e-9,
+            "p50": p50 * 1e-9,
+            "p95": p95 * 1e-9,
+            "p99": p99 * 1e-9,
+            "total": histogram.sum * 1e-9
+        }
     return summary
 
 def clear_metrics():
     """Clear all performance metrics"""
-    performance_metrics.clear()
\ No newline at end of file
+    # Reset in place: decorated functions keep references to these histograms
+    for histogram in performance_metrics.values():
+        histogram.reset()
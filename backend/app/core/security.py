@@ -1,18 +1,79 @@
 # app/core/security.py
-from jose import JWTError, jwt
+import jwt
 from datetime import datetime, timedelta, timezone
 from typing import Optional, Any
+from concurrent.futures import ProcessPoolExecutor
 from app.core.config import settings
+import asyncio
 import logging
+import os
 import bcrypt as bcrypt_lib
+from argon2 import PasswordHasher
+from argon2.exceptions import VerifyMismatchError
 import hashlib
+import hmac
+import base64
+import orjson
 import secrets
 
 logger = logging.getLogger(__name__)
 
+# Password hashing is CPU-bound, so it runs in worker processes to keep it
+# off the event loop and let concurrent logins use every core
+_password_pool: Optional[ProcessPoolExecutor] = None
+
+
+def _get_password_pool() -> ProcessPoolExecutor:
+    """Process pool for password hashing, started on first use"""
+    global _password_pool
+    if _password_pool is None:
+        _password_pool = ProcessPoolExecutor(max_workers=os.cpu_count())
+    return _password_pool
+
+
+def shutdown_password_pool():
+    """Stop the password worker processes, if any were started"""
+    global _password_pool
+    if _password_pool is not None:
+        _password_pool.shutdown(cancel_futures=True)
+        _password_pool = None
+
+# Argon2id, by default with 3 passes over 64 MiB. Deployments can tune the cost
+# through the environment; check_needs_rehash upgrades existing digests on login.
+# Parallelism stays at 1 because the process pool already spreads hashes across
+# cores, and a fixed value keeps rehash checks stable across hosts
+ARGON2_TIME_COST = int(os.getenv("ARGON2_TIME_COST", 3))
+ARGON2_MEMORY_COST = int(os.getenv("ARGON2_MEMORY_COST", 65536))
+password_hasher = PasswordHasher(time_cost=ARGON2_TIME_COST, memory_cost=ARGON2_MEMORY_COST, parallelism=1)
+
+# bcrypt only looks at the first 72 bytes of a password
+BCRYPT_MAX_PASSWORD_BYTES = 72
+
+# Signing material is fixed for the process lifetime
+_SIGNING_KEY = settings.SECRET_KEY
+_ALGORITHM = settings.ALGORITHM
+
+def _b64url(data: bytes) -> bytes:
+    """Unpadded base64url, as used in JWT segments"""
+    return base64.urlsafe_b64encode(data).rstrip(b"=")
+
+# HMAC algorithms are signed directly with a precomputed header segment;
+# anything else goes through PyJWT
+_HMAC_DIGESTS = {"HS256": hashlib.sha256, "HS384": hashlib.sha384, "HS512": hashlib.sha512}
+_HMAC_DIGEST = _HMAC_DIGESTS.get(_ALGORITHM)
+_SIGNING_KEY_BYTES = _SIGNING_KEY.encode('utf-8')
+_JWT_HEADER_SEGMENT = _b64url(orjson.dumps({"alg": _ALGORITHM, "typ": "JWT"}))
+
+def _encode_hmac_jwt(claims: dict) -> str:
+    """Sign claims as a compact JWS with the configured HS* algorithm"""
+    signing_input = _JWT_HEADER_SEGMENT + b"." + _b64url(orjson.dumps(claims))
+    signature = hmac.new(_SIGNING_KEY_BYTES, signing_input, _HMAC_DIGEST).digest()
+    return (signing_input + b"." + _b64url(signature)).decode('ascii')
+
 # Generate a separate secret for ID number encryption
 # This should be in your environment variables
 ID_ENCRYPTION_PEPPER = settings.ID_ENCRYPTION_PEPPER  # Add this to your config
+_ID_PEPPER_BYTES = ID_ENCRYPTION_PEPPER.encode('utf-8')
 
 def hash_sa_id(id_number: str) -> str:
     """
@@ -20,9 +81,8 @@ def hash_sa_id(id_number: str) -> str:
     This is one-way hashing for verification purposes
     """
     try:
-        # Combine ID number with pepper and hash
-        to_hash = f"{id_number}{ID_ENCRYPTION_PEPPER}".encode('utf-8')
-        return hashlib.sha256(to_hash).hexdigest()
+        # Combine ID number with the pre-encoded pepper and hash (same digest as id + pepper)
+        return hashlib.sha256(id_number.encode('utf-8') + _ID_PEPPER_BYTES).hexdigest()
     except Exception as e:
         logger.error(f"ID number hashing failed: {e}")
         raise
@@ -30,117 +90,172 @@ def hash_sa_id(id_number: str) -> str:
 def verify_sa_id(id_number: str, hashed_id: str) -> bool:
     """Verify South African ID number against stored hash"""
     try:
-        return hash_sa_id(id_number) == hashed_id
+        return hmac.compare_digest(hash_sa_id(id_number), hashed_id)
     except Exception as e:
         logger.error(f"ID number verification failed: {e}")
         return False
 
+def _is_bcrypt_hash(hashed_password: str) -> bool:
+    """Legacy accounts still carry bcrypt digests from before the Argon2id switch"""
+    return hashed_password.startswith(("$2a$", "$2b$", "$2y$"))
+
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """
-    Verify a plain password against a 
-    hashed password using direct bcrypt.
+    Verify a plain password against a hashed password.
+    Argon2id digests are verified with argon2-cffi, legacy
+    bcrypt digests fall back to direct bcrypt.
     """
     try:
-        # Handle password length limit (bcrypt limit is 72 bytes)
-        password_bytes = plain_password.encode('utf-8')
-        if len(password_bytes) > 72:
-            password_bytes = password_bytes[:72]
-        
-        # Verify using direct bcrypt
-        return bcrypt_lib.checkpw(password_bytes, hashed_password.encode('utf-8'))
+        if _is_bcrypt_hash(hashed_password):
+            # Handle password length limit; bcrypt digests are plain ASCII
+            return bcrypt_lib.checkpw(
+                plain_password.encode('utf-8')[:BCRYPT_MAX_PASSWORD_BYTES],
+                hashed_password.encode('ascii')
+            )
+
+        return password_hasher.verify(hashed_password, plain_password)
+    except VerifyMismatchError:
+        return False
     except Exception as e:
         logger.error(f"Password verification failed: {e}")
         return False
 
+def password_needs_rehash(hashed_password: str) -> bool:
+    """Check whether a stored digest should be upgraded to the current Argon2id parameters"""
+    if _is_bcrypt_hash(hashed_password):
+        return True
+    try:
+        return password_hasher.check_needs_rehash(hashed_password)
+    except Exception as e:
+        logger.error(f"Password rehash check failed: {e}")
+        return False
+
 def get_password_hash(password: str) -> str:
-    """Hash a password using direct bcrypt."""
+    """Hash a password using Argon2id."""
     try:
-        # Handle password length limit
-        password_bytes = password.encode('utf-8')
-        if len(password_bytes) > 72:
-            password_bytes = password_bytes[:72]
-        
-        # Hash using direct bcrypt with reasonable rounds (default is 12)
-        hashed_bytes = bcrypt_lib.hashpw(password_bytes, bcrypt_lib.gensalt())
-        return hashed_bytes.decode('utf-8')
+        return password_hasher.hash(password)
     except Exception as e:
         logger.error(f"Password hashing failed: {e}")
         raise
 
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    """Verify a password in the password process pool."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_get_password_pool(), verify_password, plain_password, hashed_password)
+
+async def hash_password_async(password: str) -> str:
+    """Hash a password in the password process pool."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_get_password_pool(), get_password_hash, password)
+
 def create_access_token(data: dict[str, Any], expires_delta: Optional[timedelta] = None):
     """Create a JWT access token."""
-    to_encode = data.copy()
+    # A unique jti keeps tokens issued within the same second distinct, so revoking one leaves the others valid
+    to_encode = {**data, "jti": secrets.token_urlsafe(12)}
     if expires_delta:
         expire = datetime.now(timezone.utc) + expires_delta
     else:
         expire = datetime.now(timezone.utc) + timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
-    to_encode.update({"exp": expire})
-    encoded_jwt = jwt.encode(to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
+    if _HMAC_DIGEST is not None:
+        to_encode["exp"] = int(expire.timestamp())
+        encoded_jwt = _encode_hmac_jwt(to_encode)
+    else:
+        to_encode.update({"exp": expire})
+        encoded_jwt = jwt.encode(to_encode, _SIGNING_KEY_BYTES, algorithm=_ALGORITHM)
     return encoded_jwt
 
 def validate_sa_id(id_number: str) -> bool:
     """Validate South African ID number using Luhn algorithm"""
-    # Basic validation
-    if len(id_number) != 13 or not id_number.isdigit():
+    # Basic validation: 13 ASCII digits, checked on all packed bytes at once
+    if len(id_number) != _SA_ID_LENGTH:
+        return False
+    try:
+        raw = id_number.encode('ascii')
+    except UnicodeEncodeError:
+        return False
+    
+    packed = int.from_bytes(raw, "big")
+    if not _all_digit_lanes(packed):
         return False
     
     # Validate date components
-    if not _validate_sa_id_date(id_number):
+    if not _validate_sa_id_date(raw):
         return False
     
     # Validate Luhn check digit
-    return _validate_luhn_check_digit(id_number)
+    if SA_ID_LUHN_SCALAR:
+        return _luhn_scalar(id_number)
+    return _luhn_packed(packed - _ASCII_ZEROS)
 
-def _validate_sa_id_date(id_number: str) -> bool:
-    """Validate the date portion of South African ID (YYMMDD)"""
-    try:
-        year = int(id_number[0:2])
-        month = int(id_number[2:4])
-        day = int(id_number[4:6])
-        
-        # Basic month validation
-        if month < 1 or month > 12:
-            return False
-        
-        # Basic day validation
-        if day < 1 or day > 31:
-            return False
-        
-        # More specific day validation for each month
-        days_in_month = {
-            1: 31, 2: 29, 3: 31, 4: 30, 5: 31, 6: 30,
-            7: 31, 8: 31, 9: 30, 10: 31, 11: 30, 12: 31
-        }
-        
-        if day > days_in_month[month]:
-            return False
-        
-        return True
-        
-    except (ValueError, KeyError):
-        return False
+# Longest day of each month, indexed by month - 1 (February allows leap years)
+_DAYS_IN_MONTH = (31, 29, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31)
+
+def _validate_sa_id_date(raw: bytes) -> bool:
+    """Validate the date portion of South African ID (YYMMDD) from its ASCII digits"""
+    month = (raw[2] - 48) * 10 + (raw[3] - 48)
+    day = (raw[4] - 48) * 10 + (raw[5] - 48)
+    
+    # Month 01-12, then day 01 up to that month's length
+    return 1 <= month <= 12 and 1 <= day <= _DAYS_IN_MONTH[month - 1]
+
+# SWAR layout of a 13-digit SA ID packed big-endian into one int (byte 0 most significant).
+# Luhn doubles the digits at offsets 1, 3, ..., 11 and adds the rest (incl. the check digit) as-is.
+_SA_ID_LENGTH = 13
+_ASCII_ZEROS = int.from_bytes(b"0" * _SA_ID_LENGTH, "big")
+_BYTE_ONES = int.from_bytes(b"\x01" * _SA_ID_LENGTH, "big")
+_HIGH_BITS = 0x80 * _BYTE_ONES
+# Adding 0x46 to an ASCII byte sets its top bit exactly when the byte is above '9'
+_ABOVE_NINE_BIAS = 0x46 * _BYTE_ONES
+_PLAIN_LANES = int.from_bytes(b"\xff\x00" * 6 + b"\xff", "big")
+_DOUBLED_LANE_ONES = int.from_bytes(b"\x00\x01" * 6 + b"\x00", "big")
+_DOUBLED_LANES = _DOUBLED_LANE_ONES * 0xFF
+# Adding 0x76 to a lane holding 2*d sets its top bit exactly when 2*d > 9
+_GT9_BIAS = 0x76 * _DOUBLED_LANE_ONES
+_GT9_BITS = 0x80 * _DOUBLED_LANE_ONES
+
+# Set SA_ID_LUHN_SCALAR=1 to fall back to the per-digit loop
+SA_ID_LUHN_SCALAR = os.getenv("SA_ID_LUHN_SCALAR", "0") == "1"
 
-def _validate_luhn_check_digit(id_number: str) -> bool:
-    """Validate the check digit using Luhn algorithm (mod 10)"""
+def _all_digit_lanes(packed: int) -> bool:
+    """True if every byte of the packed ASCII string is '0'-'9'.
+
+    With each lane's top bit forced on, subtracting '0' cannot borrow across lanes and
+    leaves the top bit set only for bytes >= '0'; ASCII bytes are < 0x80, so adding
+    0x46 cannot carry out of a lane and sets the top bit only for bytes > '9'.
+    """
+    at_least_zero = ((packed | _HIGH_BITS) - _ASCII_ZEROS) & _HIGH_BITS
+    above_nine = (packed + _ABOVE_NINE_BIAS) & _HIGH_BITS
+    return at_least_zero == _HIGH_BITS and not above_nine
+
+def _luhn_packed(digits: int) -> bool:
+    """Luhn check (mod 10) without branches, over digit values packed one per byte"""
+    twice = 2 * (digits & _DOUBLED_LANES)
+    # Lanes are at most 18 + 0x76 < 0x100, so the bias never carries into a neighbour
+    gt9 = ((twice + _GT9_BIAS) & _GT9_BITS) >> 7
+    lanes = (digits & _PLAIN_LANES) + twice - 9 * gt9
+    
+    # Every lane is <= 9, so multiplying by 0x0101... gathers the lane sum in the top byte
+    total = ((lanes * _BYTE_ONES) >> (8 * (_SA_ID_LENGTH - 1))) & 0xFF
+    return total % 10 == 0
+
+# Maps ASCII '0'-'9' to digit values 0-9 and every other byte to 255
+_ASCII_TO_DIGIT = bytes(byte - 48 if 48 <= byte <= 57 else 255 for byte in range(256))
+
+def _luhn_scalar(id_number: str) -> bool:
+    """Luhn check (mod 10) digit by digit; reference implementation for the packed version"""
     try:
-        digits = [int(d) for d in id_number]
-        check_digit = digits[-1]
-        digits_to_process = digits[:-1]
-        
-        total = 0
-        reversed_digits = list(reversed(digits_to_process))
-        
-        for i, digit in enumerate(reversed_digits):
-            if i % 2 == 0:
-                doubled = digit * 2
-                if doubled > 9:
-                    total += doubled - 9
-                else:
-                    total += doubled
-            else:
-                total += digit
-        
-        return (total + check_digit) % 10 == 0
-        
-    except (ValueError, IndexError):
-        return False
\ No newline at end of file
+        digits = id_number.encode('ascii').translate(_ASCII_TO_DIGIT)
+    except UnicodeEncodeError:
+        return False
+    if not digits or 255 in digits:
+        return False
+    
+    total = digits[-1]
+    for i, digit in enumerate(reversed(digits[:-1])):
+        if i % 2 == 0:
+            doubled = digit * 2
+            total += doubled - 9 if doubled > 9 else doubled
+        else:
+            total += digit
+    
+    return total % 10 == 0
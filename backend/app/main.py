@@ -1,37 +1,69 @@
 import os
+import asyncio
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, Depends
 from sqlalchemy import text
 from fastapi.middleware.cors import CORSMiddleware
-from app.core.database import engine
-from app.models import user, resume, analysis_result
-from app.services.gemini_ai import GeminiAIService
+from app.core.database import Base, engine, bg_engine, pool_status
+from app.models import user, resume, analysis_result  # noqa: F401 (registers the tables)
 from app.api.routes import auth, resumes, cache
 from app.core.database import get_db
 from datetime import datetime
 from app.core.performance import get_performance_summary, clear_metrics
-from sqlalchemy.orm import Session
+from app.core.log_queue import start_queue_logging
+from app.core.cache import resume_cache
+from sqlalchemy.ext.asyncio import AsyncSession
 from fastapi.responses import JSONResponse
 from app.api.dependencies import get_current_user
-from app.services.supabase_storage import SupabaseStorageService
+from app.services.supabase_storage import SupabaseStorageService, get_storage_service
+from app.services.preview_generator import shutdown_render_pool
+from app.core.security import shutdown_password_pool
+from app.services.gemini_ai import gemini_circuit
 
-# Initialize services
-storage_service = SupabaseStorageService()
-gemini_ai_service = GeminiAIService()
+# Set AUTO_CREATE_TABLES=false to skip the create_all existence probes at startup
+AUTO_CREATE_TABLES = os.getenv("AUTO_CREATE_TABLES", "true").lower() == "true"
 
-# Create database tables
-user.Base.metadata.create_all(bind=engine)
-resume.Base.metadata.create_all(bind=engine)
-analysis_result.Base.metadata.create_all(bind=engine)
+# Comma-separated frontend origins. With an explicit list the allow-origin header is
+# static; without one every origin is echoed back, as before
+CORS_ORIGINS = [origin.strip() for origin in os.getenv("FRONTEND_URL", "*").split(",") if origin.strip()]
 
-app = FastAPI(title="AI Resume Analyzer API", version="1.0.0")
+# Browsers may cache preflight responses this long (seconds)
+CORS_MAX_AGE = 86400
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Emit log records from a background thread instead of the request path
+    log_listener = start_queue_logging()
+    
+    await resume_cache.connect()
+    
+    # Create database tables. All models share one declarative Base, so a single
+    # pass covers them; deployments that manage the schema themselves can skip it
+    if AUTO_CREATE_TABLES:
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+    await auth.fill_registration_bloom()
+    yield
+    # Only close the storage client if a request ever created it
+    if get_storage_service.cache_info().currsize:
+        await get_storage_service().aclose()
+    await engine.dispose()
+    await bg_engine.dispose()
+    shutdown_render_pool()
+    shutdown_password_pool()
+    await resume_cache.close()
+    log_listener.stop()
+
+app = FastAPI(title="AI Resume Analyzer API", version="1.0.0", lifespan=lifespan)
 
 # CORS middleware
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=["*"],  
+    allow_origins=CORS_ORIGINS,
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    max_age=CORS_MAX_AGE,
 )
 
 # Routers
@@ -39,12 +71,16 @@ app.include_router(auth.router, prefix="/api/auth", tags=["authentication"])
 app.include_router(resumes.router, prefix="/api/resumes", tags=["resumes"])
 app.include_router(cache.router, prefix="/cache", tags=["cache"])
 
+
 @app.get("/")
 def read_root():
     return {"message": "AI Resume Analyzer API is running"}
 
 @app.get("/health")
-async def health_check(db: Session = Depends(get_db)):  
+async def health_check(
+    db: AsyncSession = Depends(get_db),
+    storage_service: SupabaseStorageService = Depends(get_storage_service)
+):  
     health_status = {
         "status": "healthy",
         "timestamp": datetime.utcnow().isoformat(),
@@ -57,21 +93,25 @@ async def health_check(db: Session = Depends(get_db)):
     
     failed_checks = []
 
-    # 1. Check Database Connection 
-    try:
-        db.execute(text("SELECT 1"))
-        health_status["checks"]["database"] = True
-    except Exception as e:
+    # 1. Database and 2. Supabase Storage are probed concurrently; the storage
+    # client is synchronous, so its probe runs in a worker thread
+    database_result, storage_result = await asyncio.gather(
+        db.execute(text("SELECT 1")),
+        asyncio.to_thread(storage_service.supabase.storage.from_(storage_service.bucket_name).list),
+        return_exceptions=True
+    )
+    
+    if isinstance(database_result, Exception):
         failed_checks.append("database")
-        health_status["database_error"] = str(e)
+        health_status["database_error"] = str(database_result)
+    else:
+        health_status["checks"]["database"] = True
 
-    # 2. Check Supabase Storage 
-    try:
-        files = storage_service.supabase.storage.from_(storage_service.bucket_name).list()
-        health_status["checks"]["supabase_storage"] = True
-    except Exception as e:
+    if isinstance(storage_result, Exception):
         failed_checks.append("supabase_storage")
-        health_status["supabase_error"] = str(e)
+        health_status["supabase_error"] = str(storage_result)
+    else:
+        health_status["checks"]["supabase_storage"] = True
     
     # 3. Skip Gemini API check for now to avoid async issues
     health_status["gemini_note"] = "API check temporarily disabled for deployment"
@@ -92,7 +132,9 @@ async def get_performance_metrics(current_user=Depends(get_current_user)):
     summary = get_performance_summary()
     return {
         "timestamp": datetime.utcnow().isoformat(),
-        "metrics": summary
+        "metrics": summary,
+        "database_pool": pool_status(),
+        "gemini_circuit": gemini_circuit.snapshot()
     }
 
 @app.delete("/performance/metrics")
@@ -103,6 +145,24 @@ async def clear_performance_metrics(current_user=Depends(get_current_user)):
     clear_metrics()
     return {"message": "Performance metrics cleared"}
 
+# Metrics summed into each stage of the typical resume analysis flow
+_FLOW_METRICS = {
+    "file_upload": ("file_upload_process", "supabase_upload", "supabase_upload_content"),
+    "pdf_parsing": (
+        "text_extraction_process", "pdf_extraction", "pdf_extraction_method",
+        "docx_extraction", "docx_extraction_method"
+    ),
+    "database_save": ("database_resume_save", "database_analysis_save"),
+    "database_queries": (
+        "database_analysis_query", "database_history_query",
+        "database_list_query", "database_analysis_count_query"
+    ),
+    "gemini_api": ("gemini_api_call",),
+    # Uploads are extracted from an in-memory spool, so no temp files are timed any more;
+    # the stage stays (always 0) so dashboards reading it keep working
+    "temp_file_operations": (),
+}
+
 @app.get("/performance/breakdown")
 async def get_performance_breakdown(current_user=Depends(get_current_user)):
     """
@@ -110,31 +170,13 @@ async def get_performance_breakdown(current_user=Depends(get_current_user)):
     """
     summary = get_performance_summary()
     
+    # Average per metric, looked up once; missing metrics count as 0
+    avg = {name: stats["avg"] for name, stats in summary.items()}
+    
     # Calculate typical flow breakdown with ALL metrics
     typical_flow = {
-        "file_upload": (
-            summary.get("file_upload_process", {}).get("avg", 0) +
-            summary.get("supabase_upload", {}).get("avg", 0) +
-            summary.get("supabase_upload_content", {}).get("avg", 0)
-        ),
-        "pdf_parsing": (
-            summary.get("text_extraction_process", {}).get("avg", 0) +
-            summary.get("pdf_extraction", {}).get("avg", 0) +
-            summary.get("pdf_extraction_method", {}).get("avg", 0) +
-            summary.get("docx_extraction", {}).get("avg", 0) +
-            summary.get("docx_extraction_method", {}).get("avg", 0)
-        ),
-        "database_save": (
-            summary.get("database_resume_save", {}).get("avg", 0) +
-            summary.get("database_analysis_save", {}).get("avg", 0)
-        ),
-        "database_queries": (
-            summary.get("database_analysis_query", {}).get("avg", 0) +
-            summary.get("database_history_query", {}).get("avg", 0) +
-            summary.get("database_list_query", {}).get("avg", 0) +
-            summary.get("database_analysis_count_query", {}).get("avg", 0)
-        ),
-        "gemini_api": summary.get("gemini_api_call", {}).get("avg", 0),
+        stage: sum(avg.get(name, 0) for name in names)
+        for stage, names in _FLOW_METRICS.items()
     }
     
     total = sum(typical_flow.values())
@@ -146,44 +188,38 @@ async def get_performance_breakdown(current_user=Depends(get_current_user)):
         "detailed_metrics": {
             "file_processing": {
                 "total_upload": typical_flow["file_upload"],
-                "file_content_read": summary.get("file_content_read", {}).get("avg", 0),
-                "supabase_upload": (
-                    summary.get("supabase_upload", {}).get("avg", 0) +
-                    summary.get("supabase_upload_content", {}).get("avg", 0)
-                )
+                "file_content_read": avg.get("file_content_read", 0),
+                "supabase_upload": avg.get("supabase_upload", 0) + avg.get("supabase_upload_content", 0)
             },
             "text_extraction": {
                 "total_extraction": typical_flow["pdf_parsing"],
-                "text_extraction_process": summary.get("text_extraction_process", {}).get("avg", 0),
-                "pdf_extraction": summary.get("pdf_extraction", {}).get("avg", 0),
-                "docx_extraction": summary.get("docx_extraction", {}).get("avg", 0),
-                "temp_file_operations": (
-                    summary.get("temp_file_creation", {}).get("avg", 0) +
-                    summary.get("temp_file_cleanup", {}).get("avg", 0)
-                )
+                "text_extraction_process": avg.get("text_extraction_process", 0),
+                "pdf_extraction": avg.get("pdf_extraction", 0),
+                "docx_extraction": avg.get("docx_extraction", 0),
+                "temp_file_operations": typical_flow["temp_file_operations"]
             },
             "database_operations": {
                 "saves": typical_flow["database_save"],
                 "queries": typical_flow["database_queries"]
             },
             "ai_processing": {
-                "gemini_api": summary.get("gemini_api_call", {}).get("avg", 0),
-                "analysis_structure": summary.get("structure_ai_analysis", {}).get("avg", 0),
-                "background_analysis": summary.get("perform_ai_analysis", {}).get("avg", 0)
+                "gemini_api": typical_flow["gemini_api"],
+                "analysis_structure": avg.get("structure_ai_analysis", 0),
+                "background_analysis": avg.get("perform_ai_analysis", 0)
             }
         }
     }
     
     # Add percentages
     if total > 0:
-        percentages = {}
-        for key, value in typical_flow.items():
-            percentages[f"{key}_percent"] = round((value / total) * 100, 1)
-        response_data["percentages"] = percentages
+        response_data["percentages"] = {
+            f"{key}_percent": round((value / total) * 100, 1)
+            for key, value in typical_flow.items()
+        }
     
     return {
         "performance_breakdown": response_data,
-        "sample_size": len(summary.get("gemini_api_call", {}).get("durations", [])),
+        "sample_size": summary.get("gemini_api_call", {}).get("count", 0),
         "timestamp": datetime.utcnow().isoformat(),
         "metrics_available": list(summary.keys())
     }
@@ -1,4 +1,5 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, JSON, Float
+from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Float, Index
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import relationship
 from app.core.database import Base
 from datetime import datetime
@@ -14,19 +15,24 @@ class AnalysisResult(Base):
     content_score = Column(Float)
     structure_score = Column(Float)
     skills_score = Column(Float)
-    tone_style_analysis = Column(JSON)
-    content_analysis = Column(JSON)
-    structure_analysis = Column(JSON)
-    skills_analysis = Column(JSON)
-    keyword_matches = Column(JSON)
-    skill_gaps = Column(JSON)
-    recommendations = Column(JSON)  
+    tone_style_analysis = Column(JSONB)
+    content_analysis = Column(JSONB)
+    structure_analysis = Column(JSONB)
+    skills_analysis = Column(JSONB)
+    keyword_matches = Column(JSONB)
+    skill_gaps = Column(JSONB)
+    recommendations = Column(JSONB)  
     summary = Column(Text)
-    raw_analysis = Column(JSON, nullable=True)
+    raw_analysis = Column(JSONB, nullable=True)
     analysis_date = Column(DateTime, default=datetime.utcnow)
     ai_model_used = Column(String, default="gemini-ai")
     analysis_version = Column(String, default="1.0")
     analysis_source = Column(String, default="gimini_ai")  # e.g., "gemini_ai", "custom_model"
     
+    # Latest-analysis and history lookups filter by resume and sort newest first
+    __table_args__ = (
+        Index("ix_analysis_results_resume_date", resume_id, analysis_date.desc()),
+    )
+    
     # Relationships
     resume = relationship("Resume", back_populates="analysis_results")
\ No newline at end of file
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Text, Boolean, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, String, Text, Boolean, DateTime, ForeignKey, Index
 from sqlalchemy.orm import relationship
 from app.core.database import Base
 from datetime import datetime
@@ -15,7 +15,16 @@ class Resume(Base):
     original_filename = Column(String)
     upload_date = Column(DateTime, default=datetime.utcnow)
     is_active = Column(Boolean, default=True)
+    # Full text lives in storage at extracted_text_path; extracted_text is only set for
+    # rows whose text could not be spilled (and for rows uploaded before the spill)
     extracted_text = Column(Text)
+    extracted_text_path = Column(String)
+    extracted_text_preview = Column(String(1000))
+    
+    # list_resumes filters by owner and active flag, newest upload first
+    __table_args__ = (
+        Index("ix_resumes_user_active_upload", user_id, is_active, upload_date.desc()),
+    )
     
     # Relationships
     user = relationship("User", back_populates="resumes")
@@ -1,14 +1,21 @@
-from sqlalchemy import Column, Integer, String, Boolean, DateTime
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, Index
 from sqlalchemy.orm import relationship
 from app.core.database import Base
 from datetime import datetime
 
 class User(Base):
     __tablename__ = "users"
+    __table_args__ = (
+        # The unique indexes on username and email also cover the login lookup (index-only scan)
+        Index("ix_users_username_login", "username", unique=True,
+              postgresql_include=["id", "email", "hashed_password", "is_active"]),
+        Index("ix_users_email_login", "email", unique=True,
+              postgresql_include=["id", "username", "hashed_password", "is_active"]),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
-    username = Column(String, unique=True, index=True, nullable=False)
-    email = Column(String, unique=True, index=True, nullable=False)
+    username = Column(String, nullable=False)
+    email = Column(String, nullable=False)
     name = Column(String, nullable=False)
     surname = Column(String, nullable=False)
     
@@ -1,21 +1,22 @@
 # app/schemas/analysis_result.py
-from typing import Optional, Dict, Any, List, Union
+from typing import Annotated, Optional, Any, List, Union
 from datetime import datetime
-from pydantic import BaseModel, ConfigDict, field_validator
+from pydantic import BaseModel, BeforeValidator, ConfigDict, TypeAdapter
 
-class ToneStyleAnalysis(BaseModel):
-    tips: Optional[List[Dict[str, Any]]] = None
+def _empty_skill_gaps_to_dict(v):
+    """Convert empty lists to empty dicts for skill_gaps"""
+    if v == [] or v is None:
+        return {}
+    return v
 
-class ContentAnalysis(BaseModel):
-    tips: Optional[List[Dict[str, Any]]] = None
 
-class StructureAnalysis(BaseModel):
-    tips: Optional[List[Dict[str, Any]]] = None
+# One model (and so one core schema) shared by every tips-only analysis section
+class AnalysisSection(BaseModel):
+    tips: Optional[list] = None
 
-class SkillsAnalysis(BaseModel):
+class SkillsAnalysis(AnalysisSection):
     highlighted_skills: Optional[List[str]] = []
     missing_skills: Optional[List[str]] = []
-    tips: Optional[List[Dict[str, Any]]] = None
 
 class KeywordMatches(BaseModel):
     matching_keywords: Optional[List[str]] = []
@@ -28,24 +29,16 @@ class AnalysisResultBase(BaseModel):
     content_score: Optional[float] = None
     structure_score: Optional[float] = None
     skills_score: Optional[float] = None
-    tone_style_analysis: Optional[ToneStyleAnalysis] = None
-    content_analysis: Optional[ContentAnalysis] = None
-    structure_analysis: Optional[StructureAnalysis] = None
+    tone_style_analysis: Optional[AnalysisSection] = None
+    content_analysis: Optional[AnalysisSection] = None
+    structure_analysis: Optional[AnalysisSection] = None
     skills_analysis: Optional[SkillsAnalysis] = None
     keyword_matches: Optional[KeywordMatches] = None
-    skill_gaps: Optional[Dict[str, Any]] = None
+    # Opaque AI output, passed through without a recursive validation walk
+    skill_gaps: Annotated[Optional[Any], BeforeValidator(_empty_skill_gaps_to_dict)] = None
     recommendations: Optional[List[str]] = None
     summary: Optional[str] = None
-    raw_analysis: Optional[Dict[str, Any]] = None
-
-
-    @field_validator('skill_gaps', mode='before')
-    @classmethod
-    def validate_skill_gaps(cls, v):
-        """Convert empty lists to empty dicts for skill_gaps"""
-        if v == [] or v is None:
-            return {}
-        return v
+    raw_analysis: Optional[Any] = None
 
 class AnalysisResultCreate(AnalysisResultBase):
     resume_id: int
@@ -98,10 +91,16 @@ class ResumeListResponse(BaseModel):
     file_size: int
     has_analysis: bool
 
+# Validator for bulk analysis payloads, built once instead of per row and per request
+ANALYSIS_RESULT_LIST_ADAPTER = TypeAdapter(List[AnalysisResultResponse])
+
 class ResumeListWrapper(BaseModel):
     total: int
     resumes: List[ResumeListResponse]
 
 class CompleteAnalysisResponse(BaseModel):
     resume: ResumeUploadResponse
-    analysis_result: AnalysisResultResponse
\ No newline at end of file
+    analysis_result: AnalysisResultResponse
+    
+    # Not served by any route yet, so its validator is built on first use rather than at import
+    model_config = ConfigDict(defer_build=True)
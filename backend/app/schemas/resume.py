@@ -29,7 +29,8 @@ class ResumeResponse(ResumeBase):
     upload_date: datetime
     is_active: bool
     
-    model_config = ConfigDict(from_attributes=True)
+    # Not served by any route yet, so validators are built on first use rather than at import
+    model_config = ConfigDict(from_attributes=True, defer_build=True)
 
 class ResumeWithAnalysisResponse(ResumeResponse):
     latest_analysis: Optional[AnalysisResultResponse] = None
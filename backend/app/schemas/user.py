@@ -1,7 +1,23 @@
-from pydantic import BaseModel, EmailStr, validator
-from typing import Optional
+from pydantic import AfterValidator, BaseModel, EmailStr
+from typing import Annotated, Optional
 from datetime import datetime
 
+
+def _required_consent(message: str):
+    """After-validator rejecting a withheld consent with a user-facing message"""
+    def check(value: bool) -> bool:
+        if not value:
+            raise ValueError(message)
+        return value
+    return AfterValidator(check)
+
+
+def _check_password_length(value: str) -> str:
+    if len(value) < 8:
+        raise ValueError('Password must be at least 8 characters long')
+    return value
+
+
 class UserBase(BaseModel):
     username: str
     email: EmailStr
@@ -10,28 +26,10 @@ class UserBase(BaseModel):
 
 class UserCreate(UserBase):
     sa_id_number: str
-    password: str
-    consent_popi: bool
-    consent_terms: bool
-
-
-    @validator('consent_popi')
-    def validate_popi_consent(cls, v):
-        if not v:
-            raise ValueError('POPI Act consent is required to use this service')
-        return v
-
-    @validator('consent_terms')
-    def validate_terms_consent(cls, v):
-        if not v:
-            raise ValueError('Terms and conditions consent is required')
-        return v
-
-    @validator('password')
-    def validate_password(cls, v):
-        if len(v) < 8:
-            raise ValueError('Password must be at least 8 characters long')
-        return v
+    # Plain after-validators instead of @validator classmethods, keeping the user-facing messages
+    password: Annotated[str, AfterValidator(_check_password_length)]
+    consent_popi: Annotated[bool, _required_consent('POPI Act consent is required to use this service')]
+    consent_terms: Annotated[bool, _required_consent('Terms and conditions consent is required')]
 
 class UserResponse(UserBase):
     id: int
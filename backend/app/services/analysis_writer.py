@@ -0,0 +1,83 @@
+import asyncio
+from typing import List, Optional, Tuple
+from sqlalchemy import insert
+from app.core.database import BgSessionLocal
+from app.models.analysis_result import AnalysisResult
+
+
+class AnalysisResultWriter:
+    """Group-commits AnalysisResult inserts from concurrent background analyses.
+
+    A lone write is flushed immediately; rows that arrive while a flush is in
+    progress are queued and written together in the next multi-row INSERT.
+    """
+
+    def __init__(self, batch_size: int = 100):
+        self.batch_size = batch_size
+        self._queue: "asyncio.Queue[Tuple[dict, asyncio.Future]]" = asyncio.Queue()
+        self._worker: Optional[asyncio.Task] = None
+
+    async def save(self, values: dict) -> None:
+        """Queue one analysis row and wait until it has been committed"""
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((values, future))
+        if self._worker is None or self._worker.done():
+            self._worker = asyncio.create_task(self._drain())
+        await future
+
+    async def _drain(self):
+        while not self._queue.empty():
+            batch: List[Tuple[dict, asyncio.Future]] = []
+            while not self._queue.empty() and len(batch) < self.batch_size:
+                batch.append(self._queue.get_nowait())
+            
+            try:
+                async with BgSessionLocal() as db:
+                    await db.execute(insert(AnalysisResult), [values for values, _ in batch])
+                    await db.commit()
+            except Exception as e:
+                if len(batch) == 1:
+                    _, future = batch[0]
+                    print(f"❌ Analysis insert failed: {str(e)}")
+                    if not future.done():
+                        future.set_exception(e)
+                    continue
+                # One bad row (e.g. its resume was deleted meanwhile) aborts the whole
+                # INSERT, so retry row by row and fail only the rows that fail again
+                print(f"⚠️ Batched analysis insert failed ({len(batch)} rows), retrying per row: {str(e)}")
+                await self._save_each(batch)
+            else:
+                if len(batch) > 1:
+                    print(f"💾 Saved {len(batch)} analyses in one batch")
+                for _, future in batch:
+                    if not future.done():
+                        future.set_result(None)
+
+    async def _save_each(self, batch: List[Tuple[dict, asyncio.Future]]):
+        """Insert each row under its own SAVEPOINT so failures stay isolated"""
+        async with BgSessionLocal() as db:
+            outcomes: List[Optional[Exception]] = []
+            for values, _ in batch:
+                try:
+                    async with db.begin_nested():
+                        await db.execute(insert(AnalysisResult), [values])
+                    outcomes.append(None)
+                except Exception as e:
+                    print(f"❌ Analysis insert failed for resume {values.get('resume_id')}: {str(e)}")
+                    outcomes.append(e)
+            try:
+                await db.commit()
+            except Exception as e:
+                print(f"❌ Per-row analysis commit failed: {str(e)}")
+                outcomes = [error or e for error in outcomes]
+        
+        for (_, future), error in zip(batch, outcomes):
+            if future.done():
+                continue
+            if error is None:
+                future.set_result(None)
+            else:
+                future.set_exception(error)
+
+# Global writer instance
+analysis_writer = AnalysisResultWriter()
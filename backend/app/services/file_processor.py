@@ -1,107 +1,200 @@
 import os
 from fastapi import UploadFile, HTTPException
 from PyPDF2 import PdfReader
-import docx
+from lxml import etree
 from pathlib import Path
+from typing import BinaryIO, Optional, Union
 from datetime import datetime
 import tempfile
-from app.services.supabase_storage import SupabaseStorageService
+import io
+import hashlib
+import zipfile
+import asyncio
+from app.services.supabase_storage import SupabaseStorageService, get_storage_service, UPLOAD_CHUNK_SIZE
 import uuid
+from app.core.cache import resume_cache
 from app.core.performance import timer, timing_context
 
+# MuPDF extracts PDF text in native code; PyPDF2 remains the fallback
+try:
+    import fitz
+    PYMUPDF_AVAILABLE = True
+except ImportError:
+    PYMUPDF_AVAILABLE = False
+
+# Content types accepted for resume uploads
+ALLOWED_CONTENT_TYPES = frozenset({
+    'application/pdf',
+    'application/vnd.openxmlformats-officedocument.wordprocessingml.document',
+    'application/msword',
+    'text/plain',
+})
+
+# Leading bytes of the binary formats we parse; these win over the user-supplied filename
+_MAGIC_EXTENSIONS = (
+    (b'%PDF', '.pdf'),
+    (b'PK\x03\x04', '.docx'),
+    (b'\xd0\xcf\x11\xe0', '.doc'),
+)
+_MAGIC_LENGTH = 8
+
+# WordprocessingML elements read when pulling text out of document.xml
+_W_NS = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+_W_PARAGRAPH = f"{_W_NS}p"
+_W_RUN = f"{_W_NS}r"
+_W_TEXT = f"{_W_NS}t"
+_W_RUN_BREAKS = {f"{_W_NS}tab": "\t", f"{_W_NS}br": "\n", f"{_W_NS}cr": "\n"}
+
+# Uploads larger than this are rejected before any storage or parsing work
+MAX_UPLOAD_SIZE = int(os.getenv("MAX_UPLOAD_SIZE", 10 * 1024 * 1024))
+
+# Uploads up to this size are tee'd to memory for text extraction, larger ones spill to disk
+SPOOL_MAX_MEMORY = 1024 * 1024
+
+# Characters of extracted text kept in the database for quick diagnostics
+EXTRACTED_TEXT_PREVIEW_LENGTH = 1000
+
+
+def _sniff_extension(file_path: Union[str, BinaryIO]) -> Optional[str]:
+    """Extension implied by the content's magic bytes, or None for unrecognised (e.g. plain text) content"""
+    if isinstance(file_path, str):
+        with open(file_path, 'rb') as f:
+            head = f.read(_MAGIC_LENGTH)
+    else:
+        position = file_path.tell()
+        head = file_path.read(_MAGIC_LENGTH)
+        file_path.seek(position)
+    
+    for magic, extension in _MAGIC_EXTENSIONS:
+        if head.startswith(magic):
+            return extension
+    return None
+
 
 class FileProcessor:
-    def __init__(self):
-        self.storage_service = SupabaseStorageService()
+    def __init__(self, storage_service: Optional[SupabaseStorageService] = None):
+        self.storage_service = storage_service or get_storage_service()
+        # File extension -> (timing metric, extractor)
+        self._extractors = {
+            '.pdf': ("pdf_extraction", self.extract_text_from_pdf),
+            '.docx': ("docx_extraction", self.extract_text_from_docx),
+            '.doc': ("doc_extraction", self.extract_text_from_doc),
+            '.txt': ("txt_extraction", self.extract_text_from_txt),
+        }
 
     @timer("file_upload_process")
     async def process_resume(self, file: UploadFile, user_id: int) -> dict:
         """Process uploaded resume file with comprehensive timing"""
         # Validate file type
-        allowed_types = ['application/pdf', 
-                        'application/vnd.openxmlformats-officedocument.wordprocessingml.document',
-                        'application/msword', 'text/plain']
-        
-        if file.content_type not in allowed_types:
+        if file.content_type not in ALLOWED_CONTENT_TYPES:
             raise HTTPException(400, "Invalid file type")
         
-        # Time file reading
-        with timing_context("file_content_read"):
-            file_content = await file.read()
-            await file.seek(0)  # Reset file pointer
-        
-        # Time Supabase upload
-        with timing_context("supabase_upload"):
-            upload_result = await self.upload_file_content(
-                file_content=file_content,
-                original_filename=file.filename,
-                content_type=file.content_type,
-                client_file_id=user_id, 
-                document_type="resume"
-            )
+        if file.size is not None and file.size > MAX_UPLOAD_SIZE:
+            raise HTTPException(413, f"File too large. Maximum size is {MAX_UPLOAD_SIZE // (1024 * 1024)}MB")
         
-        if not upload_result:
-            raise HTTPException(500, "Failed to upload file to storage")
+        # Local copy for text extraction, written chunk by chunk while the upload streams;
+        # it stays in memory for typical resumes and only spills to disk past SPOOL_MAX_MEMORY.
+        # The content hash is computed on the same pass so re-uploads can skip extraction
+        content_hasher = hashlib.blake2b(digest_size=16)
+        with tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_MEMORY) as local_copy:
+            # Stream the upload straight to storage instead of buffering the whole file
+            with timing_context("supabase_upload"):
+                upload_result = await self.upload_file_content(
+                    file=file,
+                    client_file_id=user_id, 
+                    document_type="resume",
+                    local_copy=local_copy,
+                    content_hasher=content_hasher
+                )
+            
+            if not upload_result:
+                raise HTTPException(500, "Failed to upload file to storage")
+            
+            # Time text extraction
+            with timing_context("text_extraction"):
+                content_hash = content_hasher.hexdigest()
+                extracted_text = await resume_cache.get_extracted_text(content_hash)
+                if extracted_text is None:
+                    local_copy.seek(0)
+                    extracted_text = await self.extract_text_from_path(local_copy, file.filename)
+                    if extracted_text:
+                        await resume_cache.set_extracted_text(content_hash, extracted_text)
         
-        # Time text extraction
-        with timing_context("text_extraction"):
-            extracted_text = await self.extract_text_from_content(
-                file_content=file_content,
-                filename=file.filename
-            )
+        # Spill the full text to storage next to the file so resume rows stay small
+        extracted_text_path = None
+        if extracted_text:
+            with timing_context("extracted_text_upload"):
+                text_path = f"{upload_result['stored_filename']}.txt"
+                # The storage client is blocking
+                if await asyncio.to_thread(
+                    self.storage_service.upload_bytes,
+                    text_path, extracted_text.encode("utf-8"), "text/plain; charset=utf-8"
+                ):
+                    extracted_text_path = text_path
         
         return {
             "file_path": upload_result["stored_filename"],
             "saved_filename": upload_result["stored_filename"],  
             "original_filename": upload_result["original_filename"],
             "extracted_text": extracted_text,
+            "extracted_text_path": extracted_text_path,
+            "extracted_text_preview": extracted_text[:EXTRACTED_TEXT_PREVIEW_LENGTH] if extracted_text else None,
             "file_type": file.content_type,
             "file_size": upload_result["file_size"]
         }
     
     @timer("supabase_upload_content")
-    async def upload_file_content(self, file_content: bytes, original_filename: str, 
-                                content_type: str, client_file_id: int, document_type: str) -> dict:
-        """Upload file content to Supabase with timing"""
+    async def upload_file_content(self, file: UploadFile, client_file_id: int, document_type: str, local_copy: Optional[BinaryIO] = None, content_hasher: Optional["hashlib._Hash"] = None) -> dict:
+        """Stream uploaded file content to Supabase in chunks with timing, optionally teeing it to a local file object and a hasher"""
         try:
-            if len(file_content) > 2 * 1024 * 1024:  # 2MB
-                compressed_content = self.compress_file(file_content)
-                file_content = compressed_content
-            print(f"📤 Starting file upload: {original_filename}")
+            print(f"📤 Starting file upload: {file.filename}")
 
             # Generate unique filename
-            file_extension = os.path.splitext(original_filename)[1]
+            file_extension = os.path.splitext(file.filename)[1]
             unique_id = str(uuid.uuid4())
             stored_filename = f"client_{client_file_id}/{document_type}_{unique_id}{file_extension}"
             
             print(f"📤 Generated filename: {stored_filename}")
             print(f"📤 Uploading to bucket: {self.storage_service.bucket_name}")
             
+            file_size = 0
+            
+            async def read_chunks():
+                nonlocal file_size
+                while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+                    file_size += len(chunk)
+                    # file.size comes from the client; the streamed byte count is what we trust
+                    if file_size > MAX_UPLOAD_SIZE:
+                        raise HTTPException(413, f"File too large. Maximum size is {MAX_UPLOAD_SIZE // (1024 * 1024)}MB")
+                    if local_copy is not None:
+                        local_copy.write(chunk)
+                    if content_hasher is not None:
+                        content_hasher.update(chunk)
+                    yield chunk
+            
             # Upload to Supabase
-            upload_response = self.storage_service.supabase.storage.from_(
-                self.storage_service.bucket_name
-            ).upload(
-                path=stored_filename,
-                file=file_content,
-                file_options={"content-type": content_type}
+            uploaded = await self.storage_service.upload_stream(
+                stored_filename,
+                read_chunks(),
+                content_type=file.content_type
             )
             
-            print(f"📤 Upload response: {upload_response}")
-            
-            if not upload_response:
-                print("❌ Upload response is None")
+            if not uploaded:
+                print("❌ Streamed upload failed")
                 return None
             
             # Return file information
             return {
-                "original_filename": original_filename,
+                "original_filename": file.filename,
                 "stored_filename": stored_filename,
                 "file_path": stored_filename,
-                "file_size": len(file_content),
-                "mime_type": content_type or "application/octet-stream",
+                "file_size": file_size,
+                "mime_type": file.content_type or "application/octet-stream",
                 "bucket_name": self.storage_service.bucket_name
             }
             
+        except HTTPException:
+            raise
         except Exception as e:
             print(f"❌ Upload error: {str(e)}")
             import traceback
@@ -110,76 +203,89 @@ class FileProcessor:
     
     @timer("text_extraction_process")
     async def extract_text_from_content(self, file_content: bytes, filename: str) -> str:
-        """Extract text from file content with timing"""
-        file_ext = Path(filename).suffix.lower()
-        
-        # Time temporary file creation
-        with timing_context("temp_file_creation"):
-            with tempfile.NamedTemporaryFile(delete=False, suffix=file_ext) as temp_file:
-                temp_file.write(file_content)
-                temp_file_path = temp_file.name
-        
+        """Extract text from in-memory file content; the parsers read it straight from memory"""
+        return await self.extract_text_from_path(io.BytesIO(file_content), filename)
+    
+    async def extract_text_from_path(self, file_path: Union[str, BinaryIO], filename: str) -> str:
+        """Extract text from a local file (or binary stream), choosing the parser from its magic bytes (falling back to the filename).
+
+        The parsers are blocking and CPU-bound, so they run in a worker thread to keep the event loop free.
+        """
+        return await asyncio.to_thread(self._extract_text_sync, file_path, filename)
+    
+    def _extract_text_sync(self, file_path: Union[str, BinaryIO], filename: str) -> str:
         try:
-            # Time the actual text extraction based on file type
-            if file_ext == '.pdf':
-                with timing_context("pdf_extraction"):
-                    return await self.extract_text_from_pdf(temp_file_path)
-            elif file_ext == '.docx':
-                with timing_context("docx_extraction"):
-                    return await self.extract_text_from_docx(temp_file_path)
-            elif file_ext == '.doc':
-                with timing_context("doc_extraction"):
-                    return await self.extract_text_from_doc(temp_file_path)
-            elif file_ext == '.txt':
-                with timing_context("txt_extraction"):
-                    return await self.extract_text_from_txt(temp_file_path)
-            else:
+            file_ext = _sniff_extension(file_path) or Path(filename).suffix.lower()
+            extractor = self._extractors.get(file_ext)
+            if extractor is None:
                 return ""
+            
+            metric_name, extract = extractor
+            # Time the actual text extraction based on file type
+            with timing_context(metric_name):
+                return extract(file_path)
         except Exception as e:
             print(f"❌ Text extraction error: {str(e)}")
             return ""
-        finally:
-            # Time file cleanup
-            with timing_context("temp_file_cleanup"):
-                try:
-                    os.unlink(temp_file_path)
-                except:
-                    pass
     
     @timer("pdf_extraction_method")
-    async def extract_text_from_pdf(self, file_path: str) -> str:
-        """Extract text from PDF file with timing"""
+    def extract_text_from_pdf(self, file_path: Union[str, BinaryIO]) -> str:
+        """Extract text from PDF file (path or binary stream) with timing"""
         try:
-            with open(file_path, 'rb') as f:
-                pdf_reader = PdfReader(f)
-                text = ""
-                for page_num, page in enumerate(pdf_reader.pages):
-                    with timing_context(f"pdf_page_{page_num}"):
-                        page_text = page.extract_text()
-                        if page_text:
-                            text += page_text + "\n"
-                return text.strip()
+            if PYMUPDF_AVAILABLE:
+                return self._extract_pdf_text_mupdf(file_path)
+            
+            pdf_reader = PdfReader(file_path)
+            page_texts = [page_text for page in pdf_reader.pages if (page_text := page.extract_text())]
+            return "\n".join(page_texts).strip()
         except Exception as e:
             print(f"❌ PDF extraction error: {str(e)}")
             return ""
     
+    def _extract_pdf_text_mupdf(self, file_path: Union[str, BinaryIO]) -> str:
+        """Extract PDF text with MuPDF, reading streams from memory"""
+        if isinstance(file_path, str):
+            pdf_document = fitz.open(file_path)
+        else:
+            pdf_document = fitz.open(stream=file_path.read(), filetype="pdf")
+        
+        with pdf_document:
+            page_texts = [page_text for page in pdf_document if (page_text := page.get_text())]
+            return "\n".join(page_texts).strip()
+    
     @timer("docx_extraction_method")
-    async def extract_text_from_docx(self, file_path: str) -> str:
-        """Extract text from DOCX file with timing"""
+    def extract_text_from_docx(self, file_path: Union[str, BinaryIO]) -> str:
+        """Extract text from DOCX file (path or binary stream) with timing"""
         try:
-            doc = docx.Document(file_path)
-            text = ""
-            for paragraph_num, paragraph in enumerate(doc.paragraphs):
-                with timing_context(f"docx_paragraph_{paragraph_num}"):
-                    if paragraph.text:
-                        text += paragraph.text + "\n"
-            return text.strip()
+            # Read document.xml directly and walk it once in lxml instead of building python-docx objects
+            with zipfile.ZipFile(file_path) as docx_archive:
+                root = etree.fromstring(docx_archive.read("word/document.xml"))
+            
+            paragraph_texts = []
+            parts = []
+            for element in root.iter(_W_PARAGRAPH, _W_TEXT, *_W_RUN_BREAKS):
+                tag = element.tag
+                if tag == _W_PARAGRAPH:
+                    # A new paragraph starts: flush the previous one
+                    if parts:
+                        paragraph_texts.append("".join(parts))
+                        parts = []
+                elif tag == _W_TEXT:
+                    if element.text:
+                        parts.append(element.text)
+                elif element.getparent().tag == _W_RUN:
+                    # Tabs and breaks inside runs (w:tab also appears as a tab stop in paragraph properties)
+                    parts.append(_W_RUN_BREAKS[tag])
+            if parts:
+                paragraph_texts.append("".join(parts))
+            
+            return "\n".join(paragraph_texts).strip()
         except Exception as e:
             print(f"❌ DOCX extraction error: {str(e)}")
             return ""
     
     @timer("doc_extraction_method")
-    async def extract_text_from_doc(self, file_path: str) -> str:
+    def extract_text_from_doc(self, file_path: Union[str, BinaryIO]) -> str:
         """Extract text from DOC file with timing"""
         try:
             print("⚠️ .doc file extraction not fully supported. Consider converting to .docx")
@@ -190,9 +296,11 @@ class FileProcessor:
             return ""
     
     @timer("txt_extraction_method")
-    async def extract_text_from_txt(self, file_path: str) -> str:
-        """Extract text from TXT file with timing"""
+    def extract_text_from_txt(self, file_path: Union[str, BinaryIO]) -> str:
+        """Extract text from TXT file (path or binary stream) with timing"""
         try:
+            if not isinstance(file_path, str):
+                return file_path.read().decode('utf-8', errors='replace').strip()
             with open(file_path, 'r', encoding='utf-8') as f:
                 return f.read().strip()
         except Exception as e:
@@ -1,61 +1,301 @@
 import os
 import asyncio
 from google import genai
-from typing import Dict, Optional
+from google.genai import errors, types
+from pydantic import BaseModel
+from typing import Dict, List, Literal, Optional
 import json
 import logging
+import re
+import orjson
+import httpx
+from functools import lru_cache
 from app.core.performance import timer
 from app.core.cache import resume_cache  
-from tenacity import retry, stop_after_attempt, wait_exponential
+from app.core.circuit_breaker import CircuitBreaker
+from tenacity import retry, retry_if_exception, stop_after_attempt, wait_exponential_jitter
 
 logger = logging.getLogger(__name__)
 
+
+class AnalysisTip(BaseModel):
+    type: Literal["good", "improve"]
+    tip: str
+    explanation: Optional[str] = None
+
+
+class AnalysisCategory(BaseModel):
+    score: int
+    tips: List[AnalysisTip]
+
+
+class AtsAnalysis(BaseModel):
+    """Shape of the analysis Gemini is constrained to return"""
+    overallScore: int
+    ATS: AnalysisCategory
+    toneAndStyle: AnalysisCategory
+    content: AnalysisCategory
+    structure: AnalysisCategory
+    skills: AnalysisCategory
+
+
+# Static parts of the analysis prompt, built once at import
+_PROMPT_PREFIX = """
+You are an expert in ATS (Applicant Tracking System) and resume analysis.
+Please analyze and rate this resume and suggest how to improve it.
+The rating can be low if the resume is bad.
+Be thorough and detailed. Don't be afraid to point out any mistakes or areas for improvement.
+If there is a lot to improve, don't hesitate to give low scores. This is to help the user to improve their resume.
+If available, use the job description for the job user is applying to to give more detailed feedback.
+If provided, take the job description into consideration.
+
+"""
+
+_PROMPT_SUFFIX = """Give each category (ATS, toneAndStyle, content, structure, skills) a score and tips:
+- Each tip has a type ("good" for strengths, "improve" for weaknesses) and a short tip
+- Add an explanation to every tip except the ATS ones
+- overallScore and every category score are integers between 0-100
+- For skills tips, be VERY specific about actual technical skills (e.g., "Python", "SQL", "Power BI", not generic terms)
+- Provide 3-4 tips for each category
+- Be honest and critical - low scores help users improve
+- Focus on actionable, specific feedback
+"""
+
+# Prompt budget for the resume and job description, in characters (~4 per Gemini token)
+RESUME_PROMPT_MAX_CHARS = 10000
+JOB_DESCRIPTION_PROMPT_MAX_CHARS = 3000
+
+
+def _truncate_at_boundary(text: str, max_chars: int) -> str:
+    """Trim text to max_chars, ending on a paragraph, line or word boundary rather than mid-word"""
+    text = text.strip()
+    if len(text) <= max_chars:
+        return text
+    
+    head = text[:max_chars + 1]
+    # Prefer dropping whole trailing paragraphs, but never give up more than half the budget
+    for separator in ("\n\n", "\n", " "):
+        cut = head.rfind(separator)
+        if cut >= max_chars // 2:
+            return head[:cut].rstrip()
+    return text[:max_chars]
+
+
+# Fallbacks for replies that wrap the JSON in markdown fences or surrounding text
+_CODE_FENCE_RE = re.compile(r'^```(?:json)?\s*|\s*```$')
+_JSON_DECODER = json.JSONDecoder()
+
+
+def _load_json_object(text: str):
+    """Decode the JSON object in a model reply: orjson first, then without code fences,
+    then raw_decode from the first brace, which stops cleanly at the end of the object"""
+    try:
+        return orjson.loads(text)
+    except orjson.JSONDecodeError:
+        pass
+    
+    text = _CODE_FENCE_RE.sub('', text.strip())
+    try:
+        return orjson.loads(text)
+    except orjson.JSONDecodeError:
+        start = text.find('{')
+        if start < 0:
+            raise json.JSONDecodeError("No JSON object found", text, 0)
+        return _JSON_DECODER.raw_decode(text, start)[0]
+
+
+# Placeholder analyses, serialized once; decoding one yields an independent copy per call
+_FALLBACK_ANALYSIS_JSON = orjson.dumps({
+    "overallScore": 50,
+    "ATS": {
+        "score": 50,
+        "tips": [
+            {
+                "type": "improve",
+                "tip": "AI analysis temporarily unavailable"
+            }
+        ]
+    },
+    "toneAndStyle": {
+        "score": 50,
+        "tips": [
+            {
+                "type": "improve",
+                "tip": "Analysis pending",
+                "explanation": "AI service is currently unavailable. Please try again later."
+            }
+        ]
+    },
+    "content": {
+        "score": 50,
+        "tips": [
+            {
+                "type": "improve",
+                "tip": "Analysis pending",
+                "explanation": "AI service is currently unavailable. Please try again later."
+            }
+        ]
+    },
+    "structure": {
+        "score": 50,
+        "tips": [
+            {
+                "type": "improve",
+                "tip": "Analysis pending",
+                "explanation": "AI service is currently unavailable. Please try again later."
+            }
+        ]
+    },
+    "skills": {
+        "score": 50,
+        "tips": [
+            {
+                "type": "improve",
+                "tip": "Analysis pending",
+                "explanation": "AI service is currently unavailable. Please try again later."
+            }
+        ]
+    },
+    "analysis_error": True
+})
+
+_SERVICE_UNAVAILABLE_ANALYSIS_JSON = orjson.dumps({
+    "overallScore": 50,
+    "ATS": {"score": 50, "tips": [{"type": "improve", "tip": "Service unavailable"}]},
+    "toneAndStyle": {"score": 50, "tips": [{"type": "improve", "tip": "Service unavailable", "explanation": "AI service initialization failed"}]},
+    "content": {"score": 50, "tips": [{"type": "improve", "tip": "Service unavailable", "explanation": "AI service initialization failed"}]},
+    "structure": {"score": 50, "tips": [{"type": "improve", "tip": "Service unavailable", "explanation": "AI service initialization failed"}]},
+    "skills": {"score": 50, "tips": [{"type": "improve", "tip": "Service unavailable", "explanation": "AI service initialization failed"}]},
+    "analysis_error": True
+})
+
+# After this many consecutive Gemini failures, calls are skipped for the cooldown (seconds)
+GEMINI_CIRCUIT_FAIL_MAX = 5
+GEMINI_CIRCUIT_RESET_TIMEOUT = 60
+gemini_circuit = CircuitBreaker("gemini", fail_max=GEMINI_CIRCUIT_FAIL_MAX, reset_timeout=GEMINI_CIRCUIT_RESET_TIMEOUT)
+
+# Top-level fields every analysis must carry
+ANALYSIS_FIELDS = frozenset(AtsAnalysis.model_fields)
+
+# Structured output: Gemini returns JSON matching AtsAnalysis, so the prompt needs no example block
+ANALYSIS_GENERATION_CONFIG = types.GenerateContentConfig(
+    response_mime_type="application/json",
+    response_schema=AtsAnalysis
+)
+
+# Keep-alive HTTP/2 connections held open to Gemini by the shared client
+GEMINI_MAX_KEEPALIVE_CONNECTIONS = 32
+GEMINI_HTTP_OPTIONS = types.HttpOptions(
+    async_client_args={
+        "http2": True,
+        "limits": httpx.Limits(max_keepalive_connections=GEMINI_MAX_KEEPALIVE_CONNECTIONS),
+    }
+)
+
+# Gemini status codes worth retrying; any other API error (bad request, auth) fails fast
+RETRYABLE_GEMINI_STATUS_CODES = frozenset({429, 500, 502, 503, 504})
+
+
+def _is_retryable_gemini_error(error: BaseException) -> bool:
+    """Rate limits, server errors and dropped connections are transient; client errors are not"""
+    if isinstance(error, errors.APIError):
+        return error.code in RETRYABLE_GEMINI_STATUS_CODES
+    return isinstance(error, httpx.TransportError)
+
+
+@retry(
+    retry=retry_if_exception(_is_retryable_gemini_error),
+    stop=stop_after_attempt(3),
+    wait=wait_exponential_jitter(initial=1, max=8),
+    reraise=True
+)
+async def _generate_content(client: genai.Client, **kwargs):
+    """generate_content with transient failures retried inside the caller's timeout"""
+    return await client.aio.models.generate_content(**kwargs)
+
+
 class GeminiAIService:
     def __init__(self):
         api_key = os.getenv("GEMINI_API_KEY")
         if not api_key:
             raise ValueError("GEMINI_API_KEY not found in environment variables")
         
-        self.client = genai.Client(api_key=api_key)
+        self.client = genai.Client(api_key=api_key, http_options=GEMINI_HTTP_OPTIONS)
         logger.info("✅ Gemini AI client initialized")
         
         self.model = "gemini-2.0-flash-exp"
+        # Analyses currently running in this worker, so identical concurrent requests share one call
+        self._inflight: Dict[tuple, asyncio.Future] = {}
 
-    @retry(stop=stop_after_attempt(2), wait=wait_exponential(multiplier=1, min=2, max=10))
     @timer("gemini_api_call")
-    async def analyze_resume_ats(self, extracted_text: str, job_title: Optional[str] = None, job_description: Optional[str] = None, user_id: str = "anonymous") -> Dict:
-        """ATS-focused resume analysis with caching and retry logic"""
+    async def analyze_resume_ats(self, extracted_text: str, job_title: Optional[str] = None, job_description: Optional[str] = None, user_id: str = "anonymous", check_cache: bool = True) -> Dict:
+        """ATS-focused resume analysis with caching; transient Gemini errors are retried.
+
+        Pass check_cache=False when the caller has just looked up the cache itself.
+        """
         
         # 1. Check cache first
-        cached_result = resume_cache.get_cached_analysis(
+        cached_result = await resume_cache.get_cached_analysis(
             user_id=user_id,
             resume_text=extracted_text,
             job_desc=job_description,
             job_title=job_title
-        )
+        ) if check_cache else None
         
         if cached_result:
             logger.info("🎯 Serving cached analysis result")
             cached_result["source"] = "cache"
             return cached_result
         
-        # 2. If not cached, call Gemini API
+        # 2. Join an identical analysis already running in this worker
+        inflight_key = (user_id, extracted_text, job_title, job_description)
+        inflight = self._inflight.get(inflight_key)
+        if inflight is not None:
+            logger.info("⏳ Joining identical in-flight analysis")
+            try:
+                return dict(await asyncio.shield(inflight))
+            except asyncio.CancelledError:
+                # Only carry on if it was the other request that got cancelled
+                if not inflight.cancelled():
+                    raise
+        
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[inflight_key] = future
+        try:
+            analysis_result = await self._analyze_uncached(extracted_text, job_title, job_description, user_id)
+            future.set_result(analysis_result)
+            return analysis_result
+        finally:
+            if not future.done():
+                future.cancel()
+            if self._inflight.get(inflight_key) is future:
+                del self._inflight[inflight_key]
+
+    async def _analyze_uncached(self, extracted_text: str, job_title: Optional[str], job_description: Optional[str], user_id: str) -> Dict:
+        """Call Gemini and cache a successful result"""
+        if not gemini_circuit.allow():
+            return self._circuit_open_analysis()
+        
         try:
             logger.info("🤖 Starting ATS resume analysis (cache miss)...")
             
             async with asyncio.timeout(30):
                 prompt = self._build_ats_analysis_prompt(extracted_text, job_title, job_description)
                 
-                response = self.client.models.generate_content(
+                # Native async client: the event loop keeps serving requests while Gemini responds
+                response = await _generate_content(
+                    self.client,
                     model=self.model,
-                    contents=prompt
+                    contents=prompt,
+                    config=ANALYSIS_GENERATION_CONFIG
                 )
+                gemini_circuit.record_success()
                 
                 analysis_result = self._parse_ai_response(response.text)
                 
                 # 3. Cache successful results
                 if not analysis_result.get('analysis_error'):
-                    resume_cache.set_cached_analysis(
+                    await resume_cache.set_cached_analysis(
                         user_id=user_id,
                         resume_text=extracted_text,
                         job_desc=job_description,
@@ -71,185 +311,57 @@ class GeminiAIService:
             
         except asyncio.TimeoutError:
             logger.error("❌ Gemini API request timed out after 30 seconds")
+            gemini_circuit.record_failure()
             error_result = self._get_fallback_analysis("Request timeout")
             error_result["source"] = "timeout"
             return error_result
         except Exception as e:
             logger.error(f"❌ Gemini AI ATS analysis error: {str(e)}")
+            gemini_circuit.record_failure()
             error_result = self._get_fallback_analysis(str(e))
             error_result["source"] = "error"
             return error_result
 
+    def _circuit_open_analysis(self) -> Dict:
+        """Fallback returned without calling Gemini while the circuit is open"""
+        logger.warning("⚡ Gemini circuit open, serving fallback analysis")
+        error_result = self._get_fallback_analysis("AI service temporarily unavailable")
+        error_result["source"] = "circuit_open"
+        return error_result
+
     def _build_ats_analysis_prompt(self, resume_text: str, job_title: Optional[str] = None, job_description: Optional[str] = None) -> str:
         """Build ATS-focused resume analysis prompt using the new format"""
         
-        clean_resume_text = resume_text.strip()[:10000]
-        clean_job_desc = (job_description or "").strip()[:3000]
+        clean_resume_text = _truncate_at_boundary(resume_text, RESUME_PROMPT_MAX_CHARS)
+        clean_job_desc = _truncate_at_boundary(job_description or "", JOB_DESCRIPTION_PROMPT_MAX_CHARS)
         
-        prompt = f"""
-You are an expert in ATS (Applicant Tracking System) and resume analysis.
-Please analyze and rate this resume and suggest how to improve it.
-The rating can be low if the resume is bad.
-Be thorough and detailed. Don't be afraid to point out any mistakes or areas for improvement.
-If there is a lot to improve, don't hesitate to give low scores. This is to help the user to improve their resume.
-If available, use the job description for the job user is applying to to give more detailed feedback.
-If provided, take the job description into consideration.
-
-JOB TITLE: {job_title or "Not specified"}
-JOB DESCRIPTION: {clean_job_desc or "Not provided"}
-
-RESUME CONTENT:
-{clean_resume_text}
-
-Provide the feedback using the following EXACT JSON format:
-{{
-  "overallScore": 75,
-  "ATS": {{
-    "score": 70,
-    "tips": [
-      {{
-        "type": "good",
-        "tip": "Clear section headings"
-      }},
-      {{
-        "type": "improve", 
-        "tip": "Add more keywords from job description"
-      }},
-      {{
-        "type": "improve",
-        "tip": "Improve formatting for ATS"
-      }}
-    ]
-  }},
-  "toneAndStyle": {{
-    "score": 80,
-    "tips": [
-      {{
-        "type": "good",
-        "tip": "Professional tone",
-        "explanation": "The resume maintains a professional tone throughout"
-      }},
-      {{
-        "type": "improve",
-        "tip": "Use more action verbs", 
-        "explanation": "Incorporate more action verbs to make achievements stand out"
-      }},
-      {{
-        "type": "improve",
-        "tip": "Quantify achievements",
-        "explanation": "Add specific numbers and metrics to demonstrate impact"
-      }}
-    ]
-  }},
-  "content": {{
-    "score": 75,
-    "tips": [
-      {{
-        "type": "good",
-        "tip": "Relevant work experience",
-        "explanation": "Work experience is relevant to the target role"
-      }},
-      {{
-        "type": "improve",
-        "tip": "Add quantifiable achievements",
-        "explanation": "Include specific numbers and metrics to demonstrate impact"
-      }},
-      {{
-        "type": "improve",
-        "tip": "Tailor to job description",
-        "explanation": "Customize content to match the specific job requirements"
-      }}
-    ]
-  }},
-  "structure": {{
-    "score": 70,
-    "tips": [
-      {{
-        "type": "good",
-        "tip": "Clear chronological order",
-        "explanation": "Work experience is presented in clear reverse chronological order"
-      }},
-      {{
-        "type": "improve",
-        "tip": "Improve spacing",
-        "explanation": "Some sections are too dense and could benefit from better spacing"
-      }},
-      {{
-        "type": "improve",
-        "tip": "Consistent formatting",
-        "explanation": "Ensure consistent formatting throughout the document"
-      }}
-    ]
-  }},
-  "skills": {{
-    "score": 85,
-    "tips": [
-      {{
-        "type": "good",
-        "tip": "SQL programming",
-        "explanation": "SQL skills are clearly demonstrated in project experience"
-      }},
-      {{
-        "type": "good",
-        "tip": "Python development",
-        "explanation": "Python programming experience is well-documented"
-      }},
-      {{
-        "type": "improve",
-        "tip": "Power BI visualization",
-        "explanation": "Add experience with data visualization tools like Power BI"
-      }},
-      {{
-        "type": "improve",
-        "tip": "Advanced Excel skills",
-        "explanation": "Include specific Advanced Excel capabilities relevant to the role"
-      }}
-    ]
-  }}
-}}
-
-CRITICAL INSTRUCTIONS:
-- Return ONLY the JSON object, no other text
-- Do not include markdown formatting or code blocks
-- Ensure all scores are integers between 0-100
-- For skills tips, be VERY specific about actual technical skills (e.g., "Python", "SQL", "Power BI", not generic terms)
-- Provide 3-4 tips for each category
-- Be honest and critical - low scores help users improve
-- Focus on actionable, specific feedback
-"""
-
-        return prompt
+        return (
+            f"{_PROMPT_PREFIX}"
+            f"JOB TITLE: {job_title or 'Not specified'}\n"
+            f"JOB DESCRIPTION: {clean_job_desc or 'Not provided'}\n\n"
+            f"RESUME CONTENT:\n{clean_resume_text}\n\n"
+            f"{_PROMPT_SUFFIX}"
+        )
 
     def _parse_ai_response(self, response_text: str) -> Dict:
-        """Parse the AI response and extract JSON"""
+        """Parse the AI response (JSON constrained to the AtsAnalysis schema)"""
         try:
             if not response_text:
                 logger.error("❌ Empty response from AI")
                 return self._get_fallback_analysis("Empty response")
             
-            cleaned_text = response_text.strip()
-            logger.info(f"📄 Raw AI response length: {len(cleaned_text)}")
+            logger.info(f"📄 Raw AI response length: {len(response_text)}")
+            result = _load_json_object(response_text)
             
-            start_idx = cleaned_text.find('{')
-            end_idx = cleaned_text.rfind('}') + 1
+            # The schema makes every field required; fill any gap defensively all the same
+            missing_fields = ANALYSIS_FIELDS.difference(result)
+            if missing_fields:
+                logger.warning(f"⚠️ Missing fields in AI response: {sorted(missing_fields)}")
+                fallback = self._get_fallback_analysis()
+                for field in missing_fields:
+                    result[field] = fallback.get(field, {})
             
-            if start_idx >= 0 and end_idx > start_idx:
-                json_str = cleaned_text[start_idx:end_idx]
-                logger.info(f"📄 Extracted JSON: {json_str[:200]}...")
-                
-                result = json.loads(json_str)
-                
-                # Validate required fields
-                required_fields = ['overallScore', 'ATS', 'toneAndStyle', 'content', 'structure', 'skills']
-                for field in required_fields:
-                    if field not in result:
-                        logger.warning(f"⚠️ Missing field in AI response: {field}")
-                        result[field] = self._get_fallback_analysis().get(field, {})
-                
-                return result
-            else:
-                logger.error("❌ No JSON structure found in AI response")
-                return self._get_fallback_analysis("No JSON structure found")
+            return result
                 
         except json.JSONDecodeError as e:
             logger.error(f"❌ JSON parsing error: {e}")
@@ -260,67 +372,17 @@ CRITICAL INSTRUCTIONS:
 
     def _get_fallback_analysis(self, error_message: str = "Unknown error") -> Dict:
         """Return comprehensive fallback analysis when AI fails"""
-        return {
-            "overallScore": 50,
-            "ATS": {
-                "score": 50,
-                "tips": [
-                    {
-                        "type": "improve",
-                        "tip": "AI analysis temporarily unavailable"
-                    }
-                ]
-            },
-            "toneAndStyle": {
-                "score": 50,
-                "tips": [
-                    {
-                        "type": "improve",
-                        "tip": "Analysis pending",
-                        "explanation": "AI service is currently unavailable. Please try again later."
-                    }
-                ]
-            },
-            "content": {
-                "score": 50,
-                "tips": [
-                    {
-                        "type": "improve",
-                        "tip": "Analysis pending",
-                        "explanation": "AI service is currently unavailable. Please try again later."
-                    }
-                ]
-            },
-            "structure": {
-                "score": 50,
-                "tips": [
-                    {
-                        "type": "improve",
-                        "tip": "Analysis pending",
-                        "explanation": "AI service is currently unavailable. Please try again later."
-                    }
-                ]
-            },
-            "skills": {
-                "score": 50,
-                "tips": [
-                    {
-                        "type": "improve",
-                        "tip": "Analysis pending",
-                        "explanation": "AI service is currently unavailable. Please try again later."
-                    }
-                ]
-            },
-            "analysis_error": True,
-            "error_message": error_message
-        }
+        # Decoding the pre-serialized template gives callers a fresh dict they are free to mutate
+        result = orjson.loads(_FALLBACK_ANALYSIS_JSON)
+        result["error_message"] = error_message
+        return result
 
     @timer("gemini_health_check")
     async def check_api_health(self) -> Dict:
         """Check if the Gemini API is working properly"""
         try:
             async with asyncio.timeout(10):
-                response = self.client.models.generate_content(
+                response = await self.client.aio.models.generate_content(
                     model=self.model,
                     contents="Respond with exactly: OK"
                 )
@@ -351,30 +413,29 @@ CRITICAL INSTRUCTIONS:
                 "model": self.model
             }
 
-try:
-    gemini_ai_service = GeminiAIService()
-    logger.info("🎯 Gemini AI service ready with caching integration")
-except Exception as e:
-    logger.error(f"💥 Gemini AI service failed to initialize: {e}")
-    
-    class FallbackAIService:
-        async def analyze_resume_ats(self, *args, **kwargs):
-            result = self._get_fallback_analysis("Service initialization failed")
-            result["source"] = "fallback"
-            return result
-            
-        async def check_api_health(self):
-            return {"status": "error", "message": "Service not initialized"}
-            
-        def _get_fallback_analysis(self, error_message: str) -> Dict:
-            return {
-                "overallScore": 50,
-                "ATS": {"score": 50, "tips": [{"type": "improve", "tip": "Service unavailable"}]},
-                "toneAndStyle": {"score": 50, "tips": [{"type": "improve", "tip": "Service unavailable", "explanation": "AI service initialization failed"}]},
-                "content": {"score": 50, "tips": [{"type": "improve", "tip": "Service unavailable", "explanation": "AI service initialization failed"}]},
-                "structure": {"score": 50, "tips": [{"type": "improve", "tip": "Service unavailable", "explanation": "AI service initialization failed"}]},
-                "skills": {"score": 50, "tips": [{"type": "improve", "tip": "Service unavailable", "explanation": "AI service initialization failed"}]},
-                "analysis_error": True
-            }
-    
-    gemini_ai_service = FallbackAIService()
\ No newline at end of file
+
+class FallbackAIService:
+    """Stand-in used when the Gemini client cannot be created"""
+    async def analyze_resume_ats(self, *args, **kwargs):
+        result = self._get_fallback_analysis("Service initialization failed")
+        result["source"] = "fallback"
+        return result
+        
+    async def check_api_health(self):
+        return {"status": "error", "message": "Service not initialized"}
+        
+    def _get_fallback_analysis(self, error_message: str) -> Dict:
+        return orjson.loads(_SERVICE_UNAVAILABLE_ANALYSIS_JSON)
+
+
+@lru_cache(maxsize=1)
+def get_gemini_ai_service():
+    """Build the AI service on first use; falls back to placeholder results if it cannot start"""
+    try:
+        service = GeminiAIService()
+        logger.info("🎯 Gemini AI service ready with caching integration")
+        return service
+    except Exception as e:
+        logger.error(f"💥 Gemini AI service failed to initialize: {e}")
+        return FallbackAIService()
+
@@ -1,114 +1,247 @@
 from fastapi import HTTPException
-from fastapi.responses import FileResponse
+from fastapi.responses import RedirectResponse, Response
+import asyncio
 import tempfile
+import hashlib
+import io
+import logging
+from functools import lru_cache
 from pathlib import Path
+from typing import Dict, List, Optional, Set, Tuple, Union
+from concurrent.futures import ProcessPoolExecutor
 import os
-from app.services.supabase_storage import SupabaseStorageService
+from app.services.supabase_storage import SupabaseStorageService, get_storage_service
+
+logger = logging.getLogger(__name__)
 
 try:
     import fitz 
     PYMUPDF_AVAILABLE = True
 except ImportError:
     PYMUPDF_AVAILABLE = False
-    print("❌ PyMuPDF not installed. Run: pip install PyMuPDF")
+    logger.error("❌ PyMuPDF not installed. Run: pip install PyMuPDF")
 
 from PIL import Image, ImageDraw, ImageFont
 
-class PreviewGenerator:
-    def __init__(self):
-        self.storage_service = SupabaseStorageService()
+# Rendered previews are stored once in the bucket, under a folder per document so they
+# can be removed with it, and served via signed URLs
+PREVIEW_DIRECTORY = "previews"
+PREVIEW_CACHE_CONTROL = "86400"
 
-    async def generate_preview(self, supabase_file_path: str, page: int = 0) -> str:
-        """Convert document page to image for preview from Supabase storage"""
-        try:
-            print(f"🎨 Generating preview for: {supabase_file_path}, page: {page}")
-            
-            # Download file from Supabase first
-            file_content = self.storage_service.download_file(supabase_file_path)
-            if not file_content:
-                raise HTTPException(500, "Failed to download file from storage")
-            
-            print(f"📥 Downloaded {len(file_content)} bytes from Supabase")
-            
-            # Get file extension from the path
-            file_ext = Path(supabase_file_path).suffix.lower()
-            
-            # Create temporary file for the downloaded content
-            with tempfile.NamedTemporaryFile(delete=False, suffix=file_ext) as temp_file:
-                temp_file.write(file_content)
-                temp_file_path = temp_file.name
-            
-            print(f"📁 Created temporary file: {temp_file_path}")
-            
-            try:
-                if file_ext == '.pdf':
-                    return await self.pdf_to_image(temp_file_path, page)
-                elif file_ext in ['.docx', '.doc']:
-                    return await self.docx_to_image(temp_file_path)
-                else:
-                    return await self.text_to_image(temp_file_path)
-            finally:
-                # Clean up the temporary downloaded file
-                try:
-                    os.unlink(temp_file_path)
-                    print(f"🧹 Cleaned up temporary file: {temp_file_path}")
-                except:
-                    pass
-                
-        except Exception as e:
-            print(f"❌ Failed to generate preview: {str(e)}")
-            raise HTTPException(500, f"Failed to generate preview: {str(e)}")
-    
-    async def pdf_to_image(self, local_file_path: str, page: int = 0) -> str:
-        """Convert PDF page to JPEG image using PyMuPDF"""
-        if not PYMUPDF_AVAILABLE:
-            return await self._create_placeholder_image("Please install PyMuPDF: pip install PyMuPDF")
+# Requested widths are rounded up to one of these, bounding the stored renders per page
+PREVIEW_WIDTHS = (200, 400, 800, 1200, 2000)
+
+# Objects listed per request when removing a document's previews
+PREVIEW_LIST_LIMIT = 1000
+
+# Rendered PDF page width in pixels; clients may ask for anything up to the maximum
+PREVIEW_DEFAULT_WIDTH = 800
+PREVIEW_MIN_WIDTH = 100
+PREVIEW_MAX_WIDTH = 2000
+
+# Previews are encoded straight to WebP (smaller than JPEG at equal quality);
+# the method trades encode speed (0) against output size (6)
+PREVIEW_WEBP_QUALITY = int(os.getenv("PREVIEW_WEBP_QUALITY", 80))
+PREVIEW_WEBP_METHOD = int(os.getenv("PREVIEW_WEBP_METHOD", 4))
+
+# Placeholder messages wrap at this pixel width; text previews show at most this many lines
+PLACEHOLDER_TEXT_WIDTH = 540
+TEXT_PREVIEW_MAX_LINES = 40
+
+# Worker processes for multi-page renders; PyMuPDF holds the GIL while it renders
+PREVIEW_RENDER_WORKERS = min(4, os.cpu_count() or 1)
+_render_pool: Optional[ProcessPoolExecutor] = None
+
+# Single-page renders run in threads; cap how many run at once so bursts cannot exhaust memory
+_render_slots = asyncio.Semaphore(os.cpu_count() or 1)
+
+# Placeholder images for fixed messages (unsupported formats, missing renderer), keyed by message
+_static_placeholders: Dict[str, bytes] = {}
+
+
+def _get_render_pool() -> ProcessPoolExecutor:
+    """Process pool for page renders, started on first use"""
+    global _render_pool
+    if _render_pool is None:
+        _render_pool = ProcessPoolExecutor(max_workers=PREVIEW_RENDER_WORKERS)
+    return _render_pool
+
+
+def shutdown_render_pool():
+    """Stop the render worker processes, if any were started"""
+    global _render_pool
+    if _render_pool is not None:
+        _render_pool.shutdown(cancel_futures=True)
+        _render_pool = None
+
+
+def _render_pdf_page(pdf_source: Union[str, bytes], page: int, width: int) -> bytes:
+    """Render one PDF page (from a file path or in-memory bytes) to WebP bytes; module-level so render worker processes can run it"""
+    try:
+        logger.debug("📄 Converting PDF to WebP, page: %s", page)
         
-        try:
-            print(f"📄 Converting PDF to JPEG: {local_file_path}, page: {page}")
-            
-            # Open the PDF
-            doc = fitz.open(local_file_path)
-            print(f"📄 PDF opened, total pages: {len(doc)}")
+        # Open the PDF; in-memory content is parsed without touching disk
+        if isinstance(pdf_source, bytes):
+            doc = fitz.open(stream=pdf_source, filetype="pdf")
+        else:
+            doc = fitz.open(pdf_source)
+        with doc:
+            page_count = doc.page_count
+            logger.debug("📄 PDF opened, total pages: %s", page_count)
             
             # Check if page exists
-            if page >= len(doc):
-                doc.close()
-                raise HTTPException(404, f"Page {page + 1} not found. PDF has {len(doc)} pages.")
+            if page >= page_count:
+                raise HTTPException(404, f"Page {page + 1} not found. PDF has {page_count} pages.")
             
             # Get the page
             pdf_page = doc[page]
-            print(f"📄 Processing page {page + 1}")
+            logger.debug("📄 Processing page %s", page + 1)
             
-            # Convert to image with good resolution
-            # Matrix: zoom factor for resolution (2.0 = 2x zoom for better quality)
-            mat = fitz.Matrix(2.0, 2.0)
+            # Render at the requested width rather than a fixed zoom; pixel count drives render and encode time
+            zoom = width / pdf_page.rect.width
+            mat = fitz.Matrix(zoom, zoom)
             pix = pdf_page.get_pixmap(matrix=mat)
-            print(f"🖼️ Created pixmap: {pix.width}x{pix.height} pixels")
+            logger.debug("🖼️ Created pixmap: %sx%s pixels", pix.width, pix.height)
             
-            # Save image to temp file
-            temp_dir = tempfile.gettempdir()
-            image_path = Path(temp_dir) / f"preview_{Path(local_file_path).stem}_{page}.jpg"
-            
-            # PyMuPDF automatically uses good quality for JPEG
-            pix.save(str(image_path))
+            # Encode in memory; the bytes go straight to storage or the response
+            image_content = pix.pil_tobytes(format="WEBP", quality=PREVIEW_WEBP_QUALITY, method=PREVIEW_WEBP_METHOD)
+            pix = None
+        
+        logger.debug("✅ PDF to WebP conversion successful: %s bytes", len(image_content))
+        return image_content
+        
+    except Exception as e:
+        logger.error("❌ PDF to WebP conversion failed: %s", e)
+        raise HTTPException(500, f"PDF conversion failed: {str(e)}")
+    finally:
+        # Every resume is a new document, so cached fonts and images are rarely reused;
+        # empty MuPDF's store so long-lived workers do not grow towards its size limit
+        fitz.TOOLS.store_shrink(100)
+
+
+@lru_cache(maxsize=16)
+def _load_font(name: str, size: int) -> ImageFont.ImageFont:
+    """TrueType font, parsed once per (name, size); PIL's default font if it is not installed"""
+    try:
+        return ImageFont.truetype(name, size)
+    except OSError:
+        return ImageFont.load_default()
+
+
+def quantize_preview_width(width: int) -> int:
+    """Smallest standard preview width that is at least the requested one"""
+    for preview_width in PREVIEW_WIDTHS:
+        if preview_width >= width:
+            return preview_width
+    return PREVIEW_WIDTHS[-1]
+
+
+def has_rendered_preview(supabase_file_path: str) -> bool:
+    """Whether the document renders to a real preview rather than a placeholder image"""
+    file_ext = Path(supabase_file_path).suffix.lower()
+    if file_ext == '.pdf':
+        return PYMUPDF_AVAILABLE
+    return file_ext not in ('.docx', '.doc')
+
+
+def _encode_webp(img: Image.Image) -> bytes:
+    """Encode a PIL image as WebP bytes in memory"""
+    buffer = io.BytesIO()
+    img.save(buffer, "WEBP", quality=PREVIEW_WEBP_QUALITY, method=PREVIEW_WEBP_METHOD)
+    return buffer.getvalue()
+
+
+class PreviewGenerator:
+    def __init__(self, storage_service: Optional[SupabaseStorageService] = None):
+        self.storage_service = storage_service or get_storage_service()
+        # In-flight preview lookups keyed by (file_path, page, width), shared by concurrent requests
+        self._inflight: Dict[Tuple[str, int, int], asyncio.Future] = {}
+        # Background renders of the page after a freshly rendered one; referenced until done
+        self._prefetch_tasks: Set[asyncio.Task] = set()
+
+    async def _download(self, supabase_file_path: str) -> bytes:
+        """Download a document from storage into memory"""
+        # The storage client is blocking
+        file_content = await asyncio.to_thread(self.storage_service.download_file, supabase_file_path)
+        if not file_content:
+            raise HTTPException(500, "Failed to download file from storage")
+        
+        logger.debug("📥 Downloaded %s bytes from Supabase", len(file_content))
+        return file_content
+
+    async def _download_to_temp_file(self, supabase_file_path: str) -> str:
+        """Download a document from storage into a temporary file, for render worker processes; the caller deletes it"""
+        file_content = await self._download(supabase_file_path)
+        
+        with tempfile.NamedTemporaryFile(delete=False, suffix=Path(supabase_file_path).suffix.lower()) as temp_file:
+            temp_file.write(file_content)
+        
+        logger.debug("📁 Created temporary file: %s", temp_file.name)
+        return temp_file.name
+
+    async def generate_preview(self, supabase_file_path: str, page: int = 0, width: int = PREVIEW_DEFAULT_WIDTH) -> bytes:
+        """Convert document page to WebP bytes for preview from Supabase storage"""
+        try:
+            logger.debug("🎨 Generating preview for: %s, page: %s", supabase_file_path, page)
             
-            doc.close()
+            file_ext = Path(supabase_file_path).suffix.lower()
+            # Renderers read the downloaded bytes directly; no temporary file is needed
+            file_content = await self._download(supabase_file_path)
             
-            print(f"✅ PDF to JPEG conversion successful: {image_path}")
-            print(f"✅ File size: {os.path.getsize(image_path)} bytes")
-            return str(image_path)
+            if file_ext == '.pdf':
+                return await self.pdf_to_image(file_content, page, width)
+            elif file_ext in ['.docx', '.doc']:
+                return await self.docx_to_image(file_content)
+            else:
+                return await self.text_to_image(file_content)
             
         except Exception as e:
-            print(f"❌ PDF to JPEG conversion failed: {str(e)}")
-            raise HTTPException(500, f"PDF conversion failed: {str(e)}")
+            logger.error("❌ Failed to generate preview: %s", e)
+            raise HTTPException(500, f"Failed to generate preview: {str(e)}")
+    
+    async def generate_previews(self, supabase_file_path: str, pages: List[int], width: int = PREVIEW_DEFAULT_WIDTH) -> List[bytes]:
+        """Render several pages of a document; PDF pages render in parallel worker processes.
+
+        Returns the WebP images in the order of pages.
+        """
+        if len(pages) <= 1 or not PYMUPDF_AVAILABLE or Path(supabase_file_path).suffix.lower() != '.pdf':
+            return [await self.generate_preview(supabase_file_path, page, width) for page in pages]
+        
+        logger.debug("🎨 Generating %s previews for: %s", len(pages), supabase_file_path)
+        temp_file_path = await self._download_to_temp_file(supabase_file_path)
+        try:
+            loop = asyncio.get_running_loop()
+            render_pool = _get_render_pool()
+            return list(await asyncio.gather(*(
+                loop.run_in_executor(render_pool, _render_pdf_page, temp_file_path, page, width)
+                for page in pages
+            )))
+        finally:
+            try:
+                os.unlink(temp_file_path)
+            except OSError:
+                pass
+    
+    async def pdf_to_image(self, pdf_source: Union[str, bytes], page: int = 0, width: int = PREVIEW_DEFAULT_WIDTH) -> bytes:
+        """Convert PDF page to WebP image of the given pixel width using PyMuPDF"""
+        if not PYMUPDF_AVAILABLE:
+            return await self._static_placeholder_image("Please install PyMuPDF: pip install PyMuPDF")
+        
+        # Rendering is CPU-bound native code; keep it off the event loop
+        async with _render_slots:
+            return await asyncio.to_thread(_render_pdf_page, pdf_source, page, width)
     
-    async def _create_placeholder_image(self, message: str) -> str:
+    async def _static_placeholder_image(self, message: str) -> bytes:
+        """Placeholder for a fixed message, drawn once and then reused"""
+        placeholder_content = _static_placeholders.get(message)
+        if placeholder_content is None:
+            placeholder_content = await self._create_placeholder_image(message)
+            _static_placeholders[message] = placeholder_content
+        return placeholder_content
+
+    async def _create_placeholder_image(self, message: str) -> bytes:
         """Create a placeholder image with error message"""
         try:
-            temp_dir = tempfile.gettempdir()
-            image_path = Path(temp_dir) / f"preview_placeholder_{os.urandom(4).hex()}.jpg"
-            
             # Create image
             img = Image.new('RGB', (600, 400), color=(240, 240, 240))
             d = ImageDraw.Draw(img)
@@ -117,129 +250,224 @@ class PreviewGenerator:
             d.rectangle([(10, 10), (590, 390)], outline='gray', width=2)
             
             # Add title
-            title_font_size = 20
-            try:
-                title_font = ImageFont.truetype("arial.ttf", title_font_size)
-            except:
-                title_font = ImageFont.load_default()
+            title_font = _load_font("arial.ttf", 20)
             
             d.text((300, 80), "Preview Not Available", fill='black', font=title_font, anchor="mm")
             
             # Add message
-            message_font_size = 14
-            try:
-                message_font = ImageFont.truetype("arial.ttf", message_font_size)
-            except:
-                message_font = ImageFont.load_default()
+            message_font = _load_font("arial.ttf", 14)
             
-            # Wrap text
-            words = message.split()
+            # Wrap text by rendered width rather than character count
             lines = []
             current_line = ""
             
-            for word in words:
-                test_line = current_line + word + " "
-                if len(test_line) < 50:
+            for word in message.split():
+                test_line = f"{current_line} {word}" if current_line else word
+                if not current_line or d.textlength(test_line, font=message_font) <= PLACEHOLDER_TEXT_WIDTH:
                     current_line = test_line
                 else:
                     lines.append(current_line)
-                    current_line = word + " "
-            if current_line:
+                    current_line = word
+                    if len(lines) == 6:  # Max 6 lines
+                        break
+            if current_line and len(lines) < 6:
                 lines.append(current_line)
             
             # Draw message lines
             y_position = 150
-            for line in lines[:6]:  # Max 6 lines
-                d.text((300, y_position), line.strip(), fill='darkred', font=message_font, anchor="mm")
+            for line in lines:
+                d.text((300, y_position), line, fill='darkred', font=message_font, anchor="mm")
                 y_position += 30
             
-            img.save(image_path, "JPEG", quality=85)
-            print(f"📝 Created placeholder image: {image_path}")
-            return str(image_path)
+            logger.debug("📝 Created placeholder image")
+            return _encode_webp(img)
             
         except Exception as e:
-            print(f"❌ Failed to create placeholder: {str(e)}")
+            logger.error("❌ Failed to create placeholder: %s", e)
             try:
-                temp_dir = tempfile.gettempdir()
-                image_path = Path(temp_dir) / f"preview_error_{os.urandom(4).hex()}.jpg"
-                img = Image.new('RGB', (300, 100), color='red')
-                img.save(image_path, "JPEG")
-                return str(image_path)
+                return _encode_webp(Image.new('RGB', (300, 100), color='red'))
             except:
                 raise HTTPException(500, "Complete preview failure")
     
-    async def docx_to_image(self, local_file_path: str) -> str:
+    async def docx_to_image(self, file_content: bytes) -> bytes:
         """Convert DOCX to image placeholder"""
-        return await self._create_placeholder_image("Word document preview is not currently supported")
+        return await self._static_placeholder_image("Word document preview is not currently supported")
     
-    async def text_to_image(self, local_file_path: str) -> str:
-        """Convert text file to image preview"""
+    async def text_to_image(self, file_content: bytes) -> bytes:
+        """Convert text file content to image preview"""
         try:
-            # Read text content
-            with open(local_file_path, 'r', encoding='utf-8') as f:
-                text_content = f.read()
+            text_content = file_content.decode('utf-8')
             
             # Create image with text
-            temp_dir = tempfile.gettempdir()
-            image_path = Path(temp_dir) / f"preview_{Path(local_file_path).stem}.jpg"
-            
-            # Create image
             img = Image.new('RGB', (800, 1000), color='white')
             d = ImageDraw.Draw(img)
             
-            # Try to use a font
-            try:
-                font = ImageFont.truetype("arial.ttf", 12)
-            except:
-                font = ImageFont.load_default()
+            font = _load_font("arial.ttf", 12)
             
             # Add title
             d.text((50, 30), "Text Document Preview", fill='black', font=font)
             d.line([(50, 55), (750, 55)], fill='gray', width=1)
             
-            # Add text lines
-            y_position = 80
-            line_count = 0
-            for line in text_content.split('\n'):
-                if line_count >= 40:  # Limit to 40 lines
-                    d.text((50, y_position), "... (content truncated)", fill='gray', font=font)
-                    break
-                    
-                if len(line) > 100:  # Limit line length
-                    line = line[:97] + "..."
-                
-                d.text((50, y_position), line, fill='black', font=font)
-                y_position += 20
-                line_count += 1
-                
-                if y_position > 950:  # Don't overflow image
-                    d.text((50, y_position), "... (content truncated)", fill='gray', font=font)
-                    break
-            
-            img.save(image_path, "JPEG", quality=85)
-            print(f"📝 Created text preview: {image_path}")
-            return str(image_path)
+            # Add text lines (max 40, each cut to 100 characters) in a single draw call
+            text_lines = text_content.split('\n', TEXT_PREVIEW_MAX_LINES)
+            shown_lines = [
+                line if len(line) <= 100 else line[:97] + "..."
+                for line in text_lines[:TEXT_PREVIEW_MAX_LINES]
+            ]
+            d.multiline_text((50, 80), "\n".join(shown_lines), fill='black', font=font, spacing=8)
+            
+            if len(text_lines) > TEXT_PREVIEW_MAX_LINES:
+                d.text((50, 80 + TEXT_PREVIEW_MAX_LINES * 20), "... (content truncated)", fill='gray', font=font)
+            
+            logger.debug("📝 Created text preview")
+            return _encode_webp(img)
             
         except Exception as e:
-            print(f"❌ Text preview failed: {str(e)}")
+            logger.error("❌ Text preview failed: %s", e)
             return await self._create_placeholder_image(f"Text preview error: {str(e)}")
     
-    async def get_preview_endpoint(self, supabase_file_path: str, page: int = 0):
-        """FastAPI endpoint to serve preview images"""
+    @staticmethod
+    def _preview_cache_key(supabase_file_path: str, page: int, width: int) -> str:
+        """Deterministic key of the WebP preview for a document page at a width"""
+        return hashlib.sha256(f"{supabase_file_path}:{page}:{width}:webp".encode()).hexdigest()
+
+    @staticmethod
+    def _preview_folder(supabase_file_path: str) -> str:
+        """Storage folder holding every stored preview of a document"""
+        return f"{PREVIEW_DIRECTORY}/{supabase_file_path}"
+
+    @classmethod
+    def _preview_storage_path(cls, supabase_file_path: str, page: int, width: int) -> str:
+        """Storage path of the cached WebP preview for a document page at a width"""
+        return f"{cls._preview_folder(supabase_file_path)}/{page}_{width}.webp"
+
+    async def delete_previews(self, supabase_file_path: str):
+        """Remove every stored preview of a document (called when the document is deleted)"""
+        folder = self._preview_folder(supabase_file_path)
+        bucket = self.storage_service.supabase.storage.from_(self.storage_service.bucket_name)
+        try:
+            while True:
+                # The storage client is blocking
+                entries = await asyncio.to_thread(bucket.list, folder, {"limit": PREVIEW_LIST_LIMIT})
+                if not entries:
+                    return
+                preview_paths = [f"{folder}/{entry['name']}" for entry in entries]
+                if await self.storage_service.delete_files(preview_paths):
+                    logger.error("❌ Some previews could not be deleted: %s", folder)
+                    return
+                if len(entries) < PREVIEW_LIST_LIMIT:
+                    return
+        except Exception as e:
+            logger.error("❌ Preview deletion failed for %s: %s", supabase_file_path, e)
+
+    async def get_cached_preview_url(self, supabase_file_path: str, page: int = 0, width: int = PREVIEW_DEFAULT_WIDTH, prefetch_next: bool = False) -> Optional[str]:
+        """Return a signed URL for the stored preview; concurrent calls for the same page share one render.
+
+        With prefetch_next, a PDF page rendered on a miss also schedules the following page in the background.
+        """
+        width = quantize_preview_width(width)
+        key = (supabase_file_path, page, width)
+        # No await between the lookup and the insert, so this is race-free on the event loop
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            return await asyncio.shield(inflight)
+        
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            signed_url = await self._load_or_render_preview(supabase_file_path, page, width, prefetch_next)
+            future.set_result(signed_url)
+            return signed_url
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Mark the exception retrieved in case no other request was waiting
+            future.exception()
+            raise
+        finally:
+            self._inflight.pop(key, None)
+
+    async def warm_preview(self, supabase_file_path: str, page: int = 0, width: int = PREVIEW_DEFAULT_WIDTH):
+        """Background task: render and store a preview ahead of the first request for it"""
+        try:
+            await self.get_cached_preview_url(supabase_file_path, page, width)
+            logger.debug("✅ Preview stored for: %s", supabase_file_path)
+        except Exception as e:
+            logger.warning("⚠️ Background preview generation failed: %s", e)
+
+    def _prefetch_preview(self, supabase_file_path: str, page: int, width: int):
+        """Render and store a page in the background, e.g. the next one a reader is likely to flip to"""
+        # Past the last page the render fails with a 404, which warm_preview only logs
+        task = asyncio.create_task(self.warm_preview(supabase_file_path, page, width))
+        self._prefetch_tasks.add(task)
+        task.add_done_callback(self._prefetch_tasks.discard)
+
+    async def _load_or_render_preview(self, supabase_file_path: str, page: int, width: int, prefetch_next: bool = False) -> Optional[str]:
+        """Return a signed URL for the stored preview, rendering and uploading it only on a miss"""
+        preview_path = self._preview_storage_path(supabase_file_path, page, width)
+        
+        signed_url = await self.storage_service.create_signed_url(preview_path)
+        if signed_url:
+            return signed_url
+        
+        logger.debug("🎨 Preview cache miss, rendering: %s, page: %s", supabase_file_path, page)
+        webp_content = await self.generate_preview(supabase_file_path, page, width)
+        if prefetch_next and Path(supabase_file_path).suffix.lower() == '.pdf':
+            self._prefetch_preview(supabase_file_path, page + 1, width)
+        # The storage client is blocking
+        if not await asyncio.to_thread(
+            self.storage_service.upload_bytes,
+            preview_path, webp_content, "image/webp", PREVIEW_CACHE_CONTROL
+        ):
+            return None
+        return await self.storage_service.create_signed_url(preview_path)
+
+    async def get_preview_endpoint(self, supabase_file_path: str, page: int = 0, width: int = PREVIEW_DEFAULT_WIDTH, if_none_match: Optional[str] = None):
+        """FastAPI endpoint to serve preview images.
+
+        Documents never change after upload, so the ETag only depends on the file, page and width;
+        a matching If-None-Match is answered with 304 before any storage or render work.
+        """
+        width = quantize_preview_width(width)
+        etag = f'"{self._preview_cache_key(supabase_file_path, page, width)}"'
+        if if_none_match == etag:
+            return Response(status_code=304, headers={"ETag": etag, "Cache-Control": "private, max-age=300"})
+        
         try:
-            print(f"🚀 Starting preview generation for: {supabase_file_path}")
-            image_path = await self.generate_preview(supabase_file_path, page)
-            print(f"✅ Preview generated successfully: {image_path}")
-            return FileResponse(image_path, media_type="image/jpeg")
+            logger.debug("🚀 Starting preview generation for: %s", supabase_file_path)
+            signed_url = await self.get_cached_preview_url(supabase_file_path, page, width, prefetch_next=True)
+            if signed_url:
+                return RedirectResponse(
+                    signed_url,
+                    status_code=307,
+                    headers={"ETag": etag, "Cache-Control": "private, max-age=300"}
+                )
+            
+            # Storage unavailable: serve the freshly rendered image directly from memory
+            webp_content = await self.generate_preview(supabase_file_path, page, width)
+            logger.debug("✅ Preview generated successfully: %s bytes", len(webp_content))
+            return Response(
+                content=webp_content,
+                media_type="image/webp",
+                headers={"ETag": etag, "Cache-Control": f"private, max-age={PREVIEW_CACHE_CONTROL}"}
+            )
         except Exception as e:
-            print(f"❌ Preview endpoint error: {str(e)}")
+            logger.error("❌ Preview endpoint error: %s", e)
             # Return placeholder image on error
-            placeholder_path = await self._create_placeholder_image(f"Preview generation failed: {str(e)}")
-            return FileResponse(placeholder_path, media_type="image/jpeg")
+            placeholder_content = await self._create_placeholder_image(f"Preview generation failed: {str(e)}")
+            return Response(content=placeholder_content, media_type="image/webp")
 
     # Static method for backward compatibility
     @staticmethod
-    async def get_preview_endpoint_static(file_path: str, page: int = 0):
+    async def get_preview_endpoint_static(file_path: str, page: int = 0, width: int = PREVIEW_DEFAULT_WIDTH):
         """Static method for backward compatibility"""
-        generator = PreviewGenerator()
-        return await generator.get_preview_endpoint(file_path, page)
\ No newline at end of file
+        global _default_generator
+        if _default_generator is None:
+            _default_generator = PreviewGenerator(get_storage_service())
+        return await _default_generator.get_preview_endpoint(file_path, page, width)
+
+
+# Shared instance behind get_preview_endpoint_static, created on first use
+_default_generator: Optional[PreviewGenerator] = None
\ No newline at end of file
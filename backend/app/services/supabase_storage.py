@@ -1,10 +1,29 @@
 import os
 import uuid
-from typing import Optional
+import asyncio
+from typing import AsyncIterator, Dict, List, Optional
 from fastapi import UploadFile, HTTPException
-from supabase import create_client, Client
-import traceback
+from supabase import create_client, Client, ClientOptions
+import httpx
+import logging
+from functools import lru_cache
 from app.core.performance import timer
+from app.core.cache import resume_cache
+
+logger = logging.getLogger(__name__)
+
+# Chunk size used when streaming uploads to storage
+UPLOAD_CHUNK_SIZE = 256 * 1024
+
+# Keep-alive connections held open to storage by the shared HTTP clients, and how long idle ones live (seconds)
+HTTP_MAX_KEEPALIVE_CONNECTIONS = 20
+HTTP_KEEPALIVE_EXPIRY = 30.0
+
+# Downloads run at once by download_many
+DOWNLOAD_CONCURRENCY = 8
+
+# Signed URLs are served from cache until this many seconds before they expire
+SIGNED_URL_EXPIRY_MARGIN = 60
 
 class SupabaseStorageService:
     def __init__(self):
@@ -16,41 +35,56 @@ class SupabaseStorageService:
             if not supabase_url or not supabase_key:
                 raise ValueError("Supabase credentials not found in environment variables")
             
-            self.supabase: Client = create_client(supabase_url, supabase_key)
-            print(f"✅ Supabase storage service initialized with bucket: {self.bucket_name}")
+            # Blocking client used by the supabase SDK; pooled so calls reuse TLS connections
+            self.sync_http_client = httpx.Client(
+                timeout=httpx.Timeout(20.0, connect=10.0),
+                limits=httpx.Limits(
+                    max_keepalive_connections=HTTP_MAX_KEEPALIVE_CONNECTIONS,
+                    keepalive_expiry=HTTP_KEEPALIVE_EXPIRY
+                ),
+                follow_redirects=True,
+                http2=True
+            )
+            self.supabase: Client = create_client(
+                supabase_url, supabase_key, options=ClientOptions(httpx_client=self.sync_http_client)
+            )
+            # Long-lived client for streamed uploads to signed upload URLs
+            self.http_client = httpx.AsyncClient(
+                timeout=httpx.Timeout(60.0, connect=10.0),
+                limits=httpx.Limits(
+                    max_keepalive_connections=HTTP_MAX_KEEPALIVE_CONNECTIONS,
+                    keepalive_expiry=HTTP_KEEPALIVE_EXPIRY
+                )
+            )
+            logger.info("✅ Supabase storage service initialized with bucket: %s", self.bucket_name)
             
         except Exception as e:
-            print(f"❌ Failed to initialize Supabase storage: {e}")
+            logger.error("❌ Failed to initialize Supabase storage: %s", e)
             raise
  
     @timer("file_upload")
     async def upload_file(self, file: UploadFile, client_file_id: int, document_type: str) -> dict:
         try:
-            print(f"📤 Starting file upload: {file.filename}")
-            
-            # Read file content
-            content = await file.read()
-            print(f"📤 Read {len(content)} bytes from file")
+            logger.debug("📤 Starting file upload: %s", file.filename)
             
             # Generate unique filename
             file_extension = os.path.splitext(file.filename)[1]
             unique_id = str(uuid.uuid4())
             stored_filename = f"client_{client_file_id}/{document_type}_{unique_id}{file_extension}"
             
-            print(f"📤 Generated filename: {stored_filename}")
-            print(f"📤 Uploading to bucket: {self.bucket_name}")
+            logger.debug("📤 Generated filename: %s", stored_filename)
+            logger.debug("📤 Uploading to bucket: %s", self.bucket_name)
             
-            # Upload to Supabase
-            upload_response = self.supabase.storage.from_(self.bucket_name).upload(
-                path=stored_filename,
-                file=content,
-                file_options={"content-type": file.content_type}
-            )
+            # Stream the spooled upload in chunks rather than reading it into memory first
+            file_size = 0
             
-            print(f"📤 Upload response: {upload_response}")
+            async def read_chunks():
+                nonlocal file_size
+                while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+                    file_size += len(chunk)
+                    yield chunk
             
-            if not upload_response:
-                print("❌ Upload response is None")
+            if not await self.upload_stream(stored_filename, read_chunks(), file.content_type):
                 return None
             
             # Return file information
@@ -58,59 +92,88 @@ class SupabaseStorageService:
                 "original_filename": file.filename,
                 "stored_filename": stored_filename,
                 "file_path": stored_filename,
-                "file_size": len(content),
+                "file_size": file_size,
                 "mime_type": file.content_type or "application/octet-stream",
                 "bucket_name": self.bucket_name
             }
             
         except Exception as e:
-            print(f"❌ Upload error: {str(e)}")
-            traceback.print_exc()
+            logger.exception("❌ Upload error: %s", e)
             return None
     
-    @timer("file_verification")
-    def verify_file_exists(self, file_path: str) -> bool:
-        """Verify that a file exists in storage"""
+    @timer("supabase_upload_stream")
+    async def upload_stream(self, file_path: str, chunks: AsyncIterator[bytes], content_type: str) -> bool:
+        """Stream file content to storage through a signed upload URL without buffering it"""
         try:
-            print(f"🔍 Verifying file existence: {file_path}")
+            # The SDK call is blocking; only the PUT below is async
+            signed_upload = await asyncio.to_thread(
+                self.supabase.storage.from_(self.bucket_name).create_signed_upload_url, file_path
+            )
             
-            # Extract directory and filename
-            directory = os.path.dirname(file_path)
-            filename = os.path.basename(file_path)
+            response = await self.http_client.put(
+                signed_upload["signed_url"],
+                content=chunks,
+                headers={"content-type": content_type or "application/octet-stream"}
+            )
+            response.raise_for_status()
             
-            print(f"🔍 Looking for file: '{filename}' in directory: '{directory}'")
+            logger.debug("✅ Streamed upload complete: %s", file_path)
+            return True
             
-            # List files in the specific directory
-            try:
-                if directory:
-                    files = self.supabase.storage.from_(self.bucket_name).list(directory)
-                else:
-                    files = self.supabase.storage.from_(self.bucket_name).list()
-            except Exception as list_error:
-                print(f"🔍 Error listing directory '{directory}': {list_error}")
-                return False
+        except HTTPException:
+            # Raised by the chunk source (e.g. the upload exceeded the size limit); aborts the PUT
+            raise
+        except Exception as e:
+            logger.exception("❌ Streamed upload error: %s", e)
+            return False
+
+    @timer("upload_bytes")
+    def upload_bytes(self, file_path: str, content: bytes, content_type: str, cache_control: str = "3600") -> bool:
+        """Upload generated content (e.g. preview images) to a fixed path, replacing any existing object"""
+        try:
+            self.supabase.storage.from_(self.bucket_name).upload(
+                path=file_path,
+                file=content,
+                file_options={"content-type": content_type, "cache-control": cache_control, "upsert": "true"}
+            )
+            logger.debug("✅ Uploaded %s bytes to: %s", len(content), file_path)
+            return True
             
-            print(f"🔍 Found {len(files)} files in directory")
+        except Exception as e:
+            logger.error("❌ Upload error for %s: %s", file_path, e)
+            return False
+
+    async def aclose(self):
+        """Close the streaming upload client and the SDK's pooled client"""
+        await self.http_client.aclose()
+        self.sync_http_client.close()
+    
+    @timer("file_verification")
+    def verify_file_exists(self, file_path: str) -> bool:
+        """Verify that a file exists in storage"""
+        try:
+            logger.debug("🔍 Verifying file existence: %s", file_path)
             
-            # Check if our file exists in the list
-            file_exists = any(
-                file_info.get('name') == filename for file_info in files
-            )
+            # A HEAD on the object itself; listing its directory costs O(files in directory)
+            file_exists = self.supabase.storage.from_(self.bucket_name).exists(file_path)
             
-            print(f"🔍 File exists in storage: {file_exists}")
+            logger.debug("🔍 File exists in storage: %s", file_exists)
             return file_exists
         
         except Exception as e:
-            print(f"❌ Error verifying file existence: {e}")
-            traceback.print_exc()
+            logger.exception("❌ Error verifying file existence: %s", e)
             return False
         
     @timer("create_signed_url")
-    def create_signed_url(self, file_path: str, expires_in: int = 3600) -> Optional[str]:
-        """Create a signed URL for file download"""
+    async def create_signed_url(self, file_path: str, expires_in: int = 3600) -> Optional[str]:
+        """Create a signed URL for file download, reusing a cached one while it is still valid"""
+        cached_url = await resume_cache.get_signed_url(file_path)
+        if cached_url:
+            return cached_url
+        
         try:
-            print(f"🔗 Creating signed URL for: {file_path}")
-            print(f"🔗 Using bucket: {self.bucket_name}")
+            logger.debug("🔗 Creating signed URL for: %s", file_path)
+            logger.debug("🔗 Using bucket: %s", self.bucket_name)
             
             # Supabase will handle file existence internally
             response = self.supabase.storage.from_(self.bucket_name).create_signed_url(
@@ -118,62 +181,72 @@ class SupabaseStorageService:
             )
             
             if response and 'signedURL' in response:
-                print(f"✅ Signed URL created successfully")
+                logger.debug("✅ Signed URL created successfully")
+                await resume_cache.set_signed_url(
+                    file_path, response['signedURL'], expires_in - SIGNED_URL_EXPIRY_MARGIN
+                )
                 return response['signedURL']
             else:
-                print(f"❌ Signed URL creation failed. Response: {response}")
+                logger.error("❌ Signed URL creation failed. Response: %s", response)
                 # Try verification as fallback
                 file_exists = self.verify_file_exists(file_path)
                 if file_exists:
-                    print(f"✅ File exists but signed URL creation failed")
+                    logger.warning("⚠️ File exists but signed URL creation failed")
                 else:
-                    print(f"❌ File does not exist: {file_path}")
+                    logger.error("❌ File does not exist: %s", file_path)
                 return None
             
         except Exception as e:
-            print(f"❌ Signed URL creation error: {str(e)}")
-            traceback.print_exc()
+            logger.exception("❌ Signed URL creation error: %s", e)
             return None
         
     @timer("delete_file_sync")
     def delete_file_sync(self, file_path: str) -> bool:
         """Synchronous version of delete_file"""
-        try:
-            print(f"🗑️ Deleting file from storage: {file_path}")
-            
-            # Try to delete directly without verification first
-            response = self.supabase.storage.from_(self.bucket_name).remove([file_path])
-            print(f"✅ File deletion response: {response}")
-            
-            # Verify deletion
-            still_exists = self.verify_file_exists(file_path)
-            if still_exists:
-                print(f"❌ File still exists after deletion attempt: {file_path}")
-                return False
-                
-            print(f"✅ File successfully deleted: {file_path}")
-            return True
-            
-        except Exception as e:
-            print(f"❌ Error deleting file {file_path}: {str(e)}")
-            traceback.print_exc()
-            return False
+        return not self.delete_files_sync([file_path])
         
     @timer("delete_file_async")
     async def delete_file(self, file_path: str) -> bool:
         """Async wrapper for delete_file"""
         return self.delete_file_sync(file_path)
 
+    @timer("delete_files_sync")
+    def delete_files_sync(self, file_paths: List[str]) -> List[str]:
+        """Delete several files in one request; returns the paths that are still in storage"""
+        try:
+            logger.debug("🗑️ Deleting %s files from storage: %s", len(file_paths), file_paths)
+            
+            response = self.supabase.storage.from_(self.bucket_name).remove(file_paths)
+            logger.debug("✅ File deletion response: %s", response)
+            
+            # Objects named in the response are gone; only the others need a check
+            deleted = {file_info.get('name') for file_info in response or []}
+            remaining = [
+                file_path for file_path in file_paths
+                if file_path not in deleted and self.verify_file_exists(file_path)
+            ]
+            if remaining:
+                logger.error("❌ Files still exist after deletion attempt: %s", remaining)
+            else:
+                logger.debug("✅ Files successfully deleted: %s", file_paths)
+            return remaining
+            
+        except Exception as e:
+            logger.exception("❌ Error deleting files %s: %s", file_paths, e)
+            return list(file_paths)
+
+    async def delete_files(self, file_paths: List[str]) -> List[str]:
+        """Async wrapper for delete_files_sync; the storage client is blocking"""
+        return await asyncio.to_thread(self.delete_files_sync, file_paths)
+
     def list_bucket_files(self) -> list:
         """List all files in the bucket for debugging"""
         try:
             files = self.supabase.storage.from_(self.bucket_name).list()
-            print(f"📁 Found {len(files)} files in bucket:")
-            for file_info in files:
-                print(f"  - {file_info}")
+            logger.debug("📁 Found %s files in bucket: %s", len(files), files)
             return files
         except Exception as e:
-            print(f"❌ Error listing bucket files: {e}")
+            logger.error("❌ Error listing bucket files: %s", e)
             return []
         
     @timer("list_directory_files")
@@ -181,12 +254,10 @@ class SupabaseStorageService:
         """List files in a specific directory"""
         try:
             files = self.supabase.storage.from_(self.bucket_name).list(directory)
-            print(f"📁 Found {len(files)} files in directory '{directory}':")
-            for file_info in files:
-                print(f"  - {file_info}")
+            logger.debug("📁 Found %s files in directory '%s': %s", len(files), directory, files)
             return files
         except Exception as e:
-            print(f"❌ Error listing directory files: {e}")
+            logger.error("❌ Error listing directory files: %s", e)
             return []
     @timer
     def get_file_info(self, file_path: str) -> Optional[dict]:
@@ -200,29 +271,49 @@ class SupabaseStorageService:
                 }
             return None
         except Exception as e:
-            print(f"❌ Error getting file info: {e}")
+            logger.error("❌ Error getting file info: %s", e)
             return None
         
     @timer("download_file")
     def download_file(self, file_path: str) -> Optional[bytes]:
         """Download file content from Supabase"""
         try:
-            print(f"📥 Downloading file: {file_path}")
+            logger.debug("📥 Downloading file: %s", file_path)
             
             response = self.supabase.storage.from_(self.bucket_name).download(file_path)
             
             if response:
-                print(f"✅ File downloaded successfully: {len(response)} bytes")
+                logger.debug("✅ File downloaded successfully: %s bytes", len(response))
                 return response
             else:
-                print("❌ Download response is None")
+                logger.error("❌ Download response is None")
                 return None
                 
         except Exception as e:
-            print(f"❌ Download error: {str(e)}")
-            traceback.print_exc()
+            logger.exception("❌ Download error: %s", e)
             return None
         
+    async def download_many(self, file_paths: List[str], concurrency: int = DOWNLOAD_CONCURRENCY) -> Dict[str, bytes]:
+        """Download several files concurrently; files that fail to download are left out"""
+        semaphore = asyncio.Semaphore(concurrency)
+        
+        async def download(file_path: str) -> Optional[bytes]:
+            async with semaphore:
+                return await asyncio.to_thread(self.download_file, file_path)
+        
+        contents = await asyncio.gather(*(download(file_path) for file_path in file_paths))
+        return {
+            file_path: content
+            for file_path, content in zip(file_paths, contents)
+            if content is not None
+        }
+        
+    @timer("download_text")
+    def download_text(self, file_path: str) -> Optional[str]:
+        """Download a UTF-8 text object (e.g. spilled resume text)"""
+        content = self.download_file(file_path)
+        return content.decode("utf-8") if content is not None else None
+        
     @timer("get_public_url")
     def get_public_url(self, file_path: str) -> Optional[str]:
         """Get public URL for file (if bucket is public)"""
@@ -230,25 +321,23 @@ class SupabaseStorageService:
             response = self.supabase.storage.from_(self.bucket_name).get_public_url(file_path)
             return response
         except Exception as e:
-            print(f"❌ Error getting public URL: {e}")
+            logger.error("❌ Error getting public URL: %s", e)
             return None
   
     # Debug method to check bucket structure
     def debug_bucket_structure(self):
         """Debug method to see the exact structure of files in the bucket"""
         try:
-            print(f"🔍 Debugging bucket structure for: {self.bucket_name}")
+            logger.debug("🔍 Debugging bucket structure for: %s", self.bucket_name)
             
             # List all files recursively
             all_files = self.supabase.storage.from_(self.bucket_name).list()
             
-            print(f"📁 Total files in bucket: {len(all_files)}")
-            for file_info in all_files:
-                print(f"  📄 {file_info}")
+            logger.debug("📁 Total files in bucket: %s (%s)", len(all_files), all_files)
                 
             return all_files
         except Exception as e:
-            print(f"❌ Error debugging bucket structure: {e}")
+            logger.error("❌ Error debugging bucket structure: %s", e)
             return []
 
     def health_check(self):
@@ -259,5 +348,11 @@ class SupabaseStorageService:
             # If we get any response (even empty), the connection is working
             return True
         except Exception as e:
-            print(f"❌ Supabase storage health check failed: {e}")
-            raise Exception(f"Supabase storage health check failed: {str(e)}")
\ No newline at end of file
+            logger.error("❌ Supabase storage health check failed: %s", e)
+            raise Exception(f"Supabase storage health check failed: {str(e)}")
+
+
+@lru_cache(maxsize=1)
+def get_storage_service() -> SupabaseStorageService:
+    """Shared storage service, created on first use"""
+    return SupabaseStorageService()
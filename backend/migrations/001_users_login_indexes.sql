@@ -0,0 +1,17 @@
+-- Replace the single-column unique indexes on users.username and users.email
+-- with unique covering indexes, so the login lookup is an index-only scan and
+-- each column keeps exactly one b-tree.
+--
+-- CREATE/DROP INDEX CONCURRENTLY cannot run inside a transaction block: run this
+-- file with plain psql (no --single-transaction). If a concurrent build fails it
+-- leaves an INVALID index behind; drop it and re-run the file.
+
+-- Build the new unique indexes first so uniqueness is enforced throughout
+CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS ix_users_username_login
+    ON users (username) INCLUDE (id, email, hashed_password, is_active);
+
+CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS ix_users_email_login
+    ON users (email) INCLUDE (id, username, hashed_password, is_active);
+
+DROP INDEX CONCURRENTLY IF EXISTS ix_users_username;
+DROP INDEX CONCURRENTLY IF EXISTS ix_users_email;
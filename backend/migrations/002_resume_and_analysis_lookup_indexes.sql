@@ -0,0 +1,12 @@
+-- Composite indexes for the resume list (owner + active flag, newest upload
+-- first) and for the latest-analysis / history lookups (resume, newest first).
+--
+-- CREATE INDEX CONCURRENTLY cannot run inside a transaction block: run this
+-- file with plain psql (no --single-transaction). If a concurrent build fails it
+-- leaves an INVALID index behind; drop it and re-run the file.
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_resumes_user_active_upload
+    ON resumes (user_id, is_active, upload_date DESC);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_analysis_results_resume_date
+    ON analysis_results (resume_id, analysis_date DESC);
@@ -0,0 +1,5 @@
+-- Full extracted text is spilled to storage; the row keeps the storage path and
+-- a short preview. Existing rows keep their text in extracted_text.
+
+ALTER TABLE resumes ADD COLUMN IF NOT EXISTS extracted_text_path VARCHAR;
+ALTER TABLE resumes ADD COLUMN IF NOT EXISTS extracted_text_preview VARCHAR(1000);
@@ -0,0 +1,16 @@
+-- Store the analysis payload columns as jsonb instead of json. This rewrites
+-- the table under an ACCESS EXCLUSIVE lock, so run it in a quiet window.
+
+BEGIN;
+
+ALTER TABLE analysis_results
+    ALTER COLUMN tone_style_analysis TYPE jsonb USING tone_style_analysis::jsonb,
+    ALTER COLUMN content_analysis TYPE jsonb USING content_analysis::jsonb,
+    ALTER COLUMN structure_analysis TYPE jsonb USING structure_analysis::jsonb,
+    ALTER COLUMN skills_analysis TYPE jsonb USING skills_analysis::jsonb,
+    ALTER COLUMN keyword_matches TYPE jsonb USING keyword_matches::jsonb,
+    ALTER COLUMN skill_gaps TYPE jsonb USING skill_gaps::jsonb,
+    ALTER COLUMN recommendations TYPE jsonb USING recommendations::jsonb,
+    ALTER COLUMN raw_analysis TYPE jsonb USING raw_analysis::jsonb;
+
+COMMIT;
@@ -0,0 +1,78 @@
+import asyncio
+from contextlib import asynccontextmanager
+
+import pytest
+
+from app.services import analysis_writer as writer_module
+from app.services.analysis_writer import AnalysisResultWriter
+
+
+class FakeSession:
+    """Stands in for an AsyncSession; rows for a resume in `bad_resume_ids` fail like an FK violation"""
+
+    def __init__(self, bad_resume_ids, committed):
+        self.bad_resume_ids = bad_resume_ids
+        self.committed = committed
+        self.pending = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def execute(self, statement, rows):
+        if any(row["resume_id"] in self.bad_resume_ids for row in rows):
+            raise RuntimeError("foreign key violation")
+        self.pending.extend(rows)
+
+    @asynccontextmanager
+    async def begin_nested(self):
+        savepoint = len(self.pending)
+        try:
+            yield
+        except Exception:
+            del self.pending[savepoint:]
+            raise
+
+    async def commit(self):
+        self.committed.extend(self.pending)
+        self.pending = []
+
+
+@pytest.fixture
+def committed(monkeypatch):
+    rows = []
+    bad_resume_ids = {2}
+    monkeypatch.setattr(writer_module, "BgSessionLocal", lambda: FakeSession(bad_resume_ids, rows))
+    return rows
+
+
+async def _save_all(writer, resume_ids):
+    return await asyncio.gather(
+        *(writer.save({"resume_id": resume_id}) for resume_id in resume_ids),
+        return_exceptions=True
+    )
+
+
+def test_concurrent_saves_are_committed(committed):
+    results = asyncio.run(_save_all(AnalysisResultWriter(), [1, 3, 4]))
+
+    assert results == [None, None, None]
+    assert [row["resume_id"] for row in committed] == [1, 3, 4]
+
+
+def test_failing_row_only_fails_its_own_caller(committed):
+    results = asyncio.run(_save_all(AnalysisResultWriter(), [1, 2, 3]))
+
+    assert results[0] is None
+    assert isinstance(results[1], RuntimeError)
+    assert results[2] is None
+    assert [row["resume_id"] for row in committed] == [1, 3]
+
+
+def test_lone_failing_row_raises(committed):
+    with pytest.raises(RuntimeError):
+        asyncio.run(AnalysisResultWriter().save({"resume_id": 2}))
+
+    assert committed == []
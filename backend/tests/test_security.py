@@ -0,0 +1,69 @@
+import random
+import time
+
+import jwt
+import pytest
+
+from app.core import security
+from app.core.config import settings
+from app.core.security import create_access_token, validate_sa_id, _encode_hmac_jwt
+
+
+def _sa_ids():
+    """Valid and invalid candidates: random digits, real check digits, bad dates and non-digits"""
+    rng = random.Random(1234)
+    candidates = ["8001015009087", "9202204720082", "0001010000008", "8002295009086", "8013015009087"]
+    for _ in range(5000):
+        digits = "".join(rng.choice("0123456789") for _ in range(12))
+        candidates.append(digits + str(rng.randrange(10)))
+        candidates.append(digits + _check_digit(digits))
+    candidates += ["800101500908", "80010150090871", "80010150090a7", "8001015009 87", "８００１０１５００９０８７", ""]
+    return candidates
+
+
+def _check_digit(first_twelve):
+    total = 0
+    for i, digit in enumerate(reversed(first_twelve)):
+        doubled = int(digit) * 2 if i % 2 == 0 else int(digit)
+        total += doubled - 9 if doubled > 9 else doubled
+    return str((10 - total % 10) % 10)
+
+
+def test_packed_sa_id_validation_matches_scalar(monkeypatch):
+    candidates = _sa_ids()
+    packed = [validate_sa_id(id_number) for id_number in candidates]
+
+    monkeypatch.setattr(security, "SA_ID_LUHN_SCALAR", True)
+    scalar = [validate_sa_id(id_number) for id_number in candidates]
+
+    assert packed == scalar
+    assert any(packed) and not all(packed)
+
+
+def test_packed_luhn_matches_scalar_luhn():
+    for id_number in _sa_ids():
+        if len(id_number) != 13 or not id_number.isascii() or not id_number.isdigit():
+            continue
+        packed = int.from_bytes(id_number.encode('ascii'), "big") - security._ASCII_ZEROS
+        assert security._luhn_packed(packed) == security._luhn_scalar(id_number), id_number
+
+
+@pytest.mark.skipif(security._HMAC_DIGEST is None, reason="direct signing only covers HS* algorithms")
+def test_hmac_jwt_round_trips_through_pyjwt():
+    claims = {"sub": "thandi", "user_id": 7, "email": "thandi@example.com", "exp": int(time.time()) + 60}
+
+    token = _encode_hmac_jwt(claims)
+
+    assert jwt.get_unverified_header(token) == {"alg": settings.ALGORITHM, "typ": "JWT"}
+    assert jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM]) == claims
+
+
+def test_access_tokens_are_never_reused():
+    claims = {"sub": "thandi", "user_id": 7, "email": "thandi@example.com"}
+
+    first = create_access_token(claims)
+    second = create_access_token(claims)
+
+    assert first != second
+    decoded = jwt.decode(first, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
+    assert decoded["sub"] == "thandi" and decoded["jti"]